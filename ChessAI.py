@@ -6,95 +6,627 @@ Handling the AI moves and scoring the board/pieces
 
 # Importing the required libraries
 import random
-
-# Setting the scores for each piece
-piece_score = {"K": 0, "Q": 9, "R": 5, "B": 3, "N": 3, "p": 1}
-
-knight_scores = [[0.0, 0.1, 0.2, 0.2, 0.2, 0.2, 0.1, 0.0],
-                 [0.1, 0.3, 0.5, 0.5, 0.5, 0.5, 0.3, 0.1],
-                 [0.2, 0.5, 0.6, 0.65, 0.65, 0.6, 0.5, 0.2],
-                 [0.2, 0.55, 0.65, 0.7, 0.7, 0.65, 0.55, 0.2],
-                 [0.2, 0.5, 0.65, 0.7, 0.7, 0.65, 0.5, 0.2],
-                 [0.2, 0.55, 0.6, 0.65, 0.65, 0.6, 0.55, 0.2],
-                 [0.1, 0.3, 0.5, 0.55, 0.55, 0.5, 0.3, 0.1],
-                 [0.0, 0.1, 0.2, 0.2, 0.2, 0.2, 0.1, 0.0]]
-
-bishop_scores = [[0.0, 0.2, 0.2, 0.2, 0.2, 0.2, 0.2, 0.0],
-                 [0.2, 0.4, 0.4, 0.4, 0.4, 0.4, 0.4, 0.2],
-                 [0.2, 0.4, 0.5, 0.6, 0.6, 0.5, 0.4, 0.2],
-                 [0.2, 0.5, 0.5, 0.6, 0.6, 0.5, 0.5, 0.2],
-                 [0.2, 0.4, 0.6, 0.6, 0.6, 0.6, 0.4, 0.2],
-                 [0.2, 0.6, 0.6, 0.6, 0.6, 0.6, 0.6, 0.2],
-                 [0.2, 0.5, 0.4, 0.4, 0.4, 0.4, 0.5, 0.2],
-                 [0.0, 0.2, 0.2, 0.2, 0.2, 0.2, 0.2, 0.0]]
-
-rook_scores = [[0.25, 0.25, 0.25, 0.25, 0.25, 0.25, 0.25, 0.25],
-               [0.5, 0.75, 0.75, 0.75, 0.75, 0.75, 0.75, 0.5],
-               [0.0, 0.25, 0.25, 0.25, 0.25, 0.25, 0.25, 0.0],
-               [0.0, 0.25, 0.25, 0.25, 0.25, 0.25, 0.25, 0.0],
-               [0.0, 0.25, 0.25, 0.25, 0.25, 0.25, 0.25, 0.0],
-               [0.0, 0.25, 0.25, 0.25, 0.25, 0.25, 0.25, 0.0],
-               [0.0, 0.25, 0.25, 0.25, 0.25, 0.25, 0.25, 0.0],
-               [0.25, 0.25, 0.25, 0.5, 0.5, 0.25, 0.25, 0.25]]
-
-queen_scores = [[0.0, 0.2, 0.2, 0.3, 0.3, 0.2, 0.2, 0.0],
-                [0.2, 0.4, 0.4, 0.4, 0.4, 0.4, 0.4, 0.2],
-                [0.2, 0.4, 0.5, 0.5, 0.5, 0.5, 0.4, 0.2],
-                [0.3, 0.4, 0.5, 0.5, 0.5, 0.5, 0.4, 0.3],
-                [0.4, 0.4, 0.5, 0.5, 0.5, 0.5, 0.4, 0.3],
-                [0.2, 0.5, 0.5, 0.5, 0.5, 0.5, 0.4, 0.2],
-                [0.2, 0.4, 0.5, 0.4, 0.4, 0.4, 0.4, 0.2],
-                [0.0, 0.2, 0.2, 0.3, 0.3, 0.2, 0.2, 0.0]]
-
-pawn_scores = [[0.8, 0.8, 0.8, 0.8, 0.8, 0.8, 0.8, 0.8],
-               [0.7, 0.7, 0.7, 0.7, 0.7, 0.7, 0.7, 0.7],
-               [0.3, 0.3, 0.4, 0.5, 0.5, 0.4, 0.3, 0.3],
-               [0.25, 0.25, 0.3, 0.45, 0.45, 0.3, 0.25, 0.25],
-               [0.2, 0.2, 0.2, 0.4, 0.4, 0.2, 0.2, 0.2],
-               [0.25, 0.15, 0.1, 0.2, 0.2, 0.1, 0.15, 0.25],
-               [0.25, 0.3, 0.3, 0.0, 0.0, 0.3, 0.3, 0.25],
-               [0.2, 0.2, 0.2, 0.2, 0.2, 0.2, 0.2, 0.2]]
-
-piece_position_scores = {"wN": knight_scores,
-                         "bN": knight_scores[::-1],
-                         "wB": bishop_scores,
-                         "bB": bishop_scores[::-1],
-                         "wQ": queen_scores,
-                         "bQ": queen_scores[::-1],
-                         "wR": rook_scores,
-                         "bR": rook_scores[::-1],
-                         "wp": pawn_scores,
-                         "bp": pawn_scores[::-1]}
+import time
+import os
+import multiprocessing
+import cProfile
+import io
+import json
+import logging
+import pstats
+import ChessEngine, ChessBook, ChessScores, ChessTablebase
 
 # Constants
 CHECKMATE = 1000
 STALEMATE = 0
-DEPTH = 3
+TABLEBASE_WIN = CHECKMATE // 2  # Score of a tablebase win, less its distance to mate in plies so faster mates score higher
+MAX_DEPTH = 32  # Iterative deepening stops here even if there is time left
+TIME_LIMIT_MS = 2000  # Time budget for one move
+PARALLEL_WORKERS = max(1, (os.cpu_count() or 1) - 1)  # Processes used by findBestMoveParallel
+DELTA_MARGIN = 2  # Quiescence search skips captures that cannot raise alpha even with this much extra
+USE_BOOK = True  # Play from the opening book (ChessBook.BOOK_PATH) when it has the position
+USE_TABLEBASES = True  # Use the endgame tablebases in ChessTablebase.TABLEBASE_DIR when they cover the position
+DEBUG_EVALUATION = False  # Compare the incremental evaluation with a full recompute at every leaf
+PROFILE_SEARCH = False  # Run findBestMove under cProfile and keep the slowest functions in the search statistics
+PROFILE_LINES = 20  # Functions kept from the profile
+TT_SIZE_MB = 16  # Memory budget of the transposition table
 
-# Find the best move using NegaMax with Alpha Beta Pruning
-def findBestMove(game_state, valid_moves, return_queue):
-    global next_move
-    next_move = None
+# Transposition table entry types
+EXACT = 0
+LOWER_BOUND = 1
+UPPER_BOUND = 2
+
+# Fixed-size hash table of searched positions, a slot is replaced when the new search went at least as deep
+class TranspositionTable:
+
+    ENTRY_SIZE_BYTES = 160  # Rough size of one entry tuple and its list slot
+
+    def __init__(self, size_mb=TT_SIZE_MB):
+
+        # Round the number of slots down to a power of two so the index is a bit mask
+        max_entries = max(1, size_mb * 1024 * 1024 // self.ENTRY_SIZE_BYTES)
+        self.size = 1 << (max_entries.bit_length() - 1)
+        self.mask = self.size - 1
+        self.entries = [None] * self.size
+        self.generation = 0
+        self.resetCounters()
+
+    def resetCounters(self):
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0
+        self.stores = 0
+
+    # Start a new search so entries from older searches can be overwritten first
+    def newSearch(self):
+        self.generation += 1
+        self.resetCounters()
+
+    # Remove every entry
+    def clear(self):
+        self.entries = [None] * self.size
+        self.resetCounters()
+
+    # Look up a position, returns (depth, flag, score, best_move_id) or None
+    def probe(self, key):
+
+        entry = self.entries[key & self.mask]
+        if (entry is None):
+            self.misses += 1
+            return None
+        if (entry[0] != key):
+            self.collisions += 1
+            return None
+        self.hits += 1
+        return entry[1:5]
+
+    # Save a search result, keeping a deeper entry from the current search over a shallower one
+    def store(self, key, depth, flag, score, best_move_id):
+
+        index = key & self.mask
+        entry = self.entries[index]
+        if (entry is None or entry[5] != self.generation or entry[0] == key or depth >= entry[1]):
+            self.entries[index] = (key, depth, flag, score, best_move_id, self.generation)
+            self.stores += 1
+
+    # Fraction of slots in use
+    def usage(self):
+        return sum(1 for entry in self.entries if entry is not None) / self.size
+
+transposition_table = TranspositionTable()
+
+# Move ordering scores, a better ordered move list lets alpha beta prune more
+TT_MOVE_ORDER = 1000000
+CAPTURE_ORDER = 100000
+PROMOTION_ORDER = 90000
+KILLER_ORDER = 80000
+
+# Quiet moves that caused a beta cutoff, two per ply, and how often each quiet move caused one
+killer_moves = [[None, None] for _ in range(MAX_DEPTH + 1)]
+history_table = {}
+
+# How often the first move searched was already good enough for a cutoff
+beta_cutoffs = 0
+first_move_cutoffs = 0
+
+# Forget the killer moves, history and cutoff counters of the last search
+def resetMoveOrdering():
+    global killer_moves, history_table, beta_cutoffs, first_move_cutoffs
+    killer_moves = [[None, None] for _ in range(MAX_DEPTH + 1)]
+    history_table = {}
+    beta_cutoffs = 0
+    first_move_cutoffs = 0
+
+# Fraction of beta cutoffs that happened on the first move searched
+def firstMoveCutoffRate():
+    return first_move_cutoffs / beta_cutoffs if beta_cutoffs else 0.0
+
+# Sort moves: transposition table move, captures by most valuable victim / least valuable attacker,
+# promotions, killer moves and then quiet moves by history
+def orderMoves(valid_moves, tt_move_id, ply):
+
+    killers = killer_moves[ply]
+
+    def moveOrder(move):
+        if (move.moveID == tt_move_id):
+            return TT_MOVE_ORDER
+        if (move.is_capture):
+            return CAPTURE_ORDER + mvvLva(move)
+        if (move.is_pawn_promotion):
+            return PROMOTION_ORDER
+        if (move.moveID == killers[0]):
+            return KILLER_ORDER
+        if (move.moveID == killers[1]):
+            return KILLER_ORDER - 1
+        return history_table.get(move.moveID, 0)
+
+    return sorted(valid_moves, key=moveOrder, reverse=True)
+
+# Most valuable victim / least valuable attacker score of a capture
+def mvvLva(move):
+    return 10 * ChessScores.piece_score[move.piece_captured[1]] - ChessScores.piece_score[move.piece_moved[1]]
+
+# Remember a quiet move that caused a beta cutoff
+def storeCutoffMove(move, depth, ply):
+
+    killers = killer_moves[ply]
+    if (killers[0] != move.moveID):
+        killers[1] = killers[0]
+        killers[0] = move.moveID
+    history_table[move.moveID] = history_table.get(move.moveID, 0) + depth * depth
+
+# Statistics of one move decision, filled in by iterativeDeepening and returned by findBestMove
+class SearchStats:
+
+    def __init__(self, source="search"):
+
+        self.source = source  # search, tablebase, book or only move
+        self.depth = 0
+        self.nodes = 0
+        self.qsearch_nodes = 0
+        self.beta_cutoffs = 0
+        self.first_move_cutoffs = 0
+        self.tt_hits = 0
+        self.tt_misses = 0
+        self.tt_collisions = 0
+        self.seconds = 0.0
+        self.iterations = []  # (depth, score, nodes, seconds) of every completed depth, nodes and time are totals
+        self.principal_variation = []
+        self.profile = None  # Text of the slowest functions when PROFILE_SEARCH is on
+
+    def nodesPerSecond(self):
+        return (self.nodes + self.qsearch_nodes) / self.seconds if self.seconds > 0 else 0.0
+
+    # Effective branching factor: nodes of the last depth over nodes of the depth before
+    def branchingFactor(self):
+
+        if (len(self.iterations) < 2):
+            return 0.0
+        last_nodes = self.iterations[-1][2] - self.iterations[-2][2]
+        previous_nodes = self.iterations[-2][2] - (self.iterations[-3][2] if len(self.iterations) > 2 else 0)
+        return last_nodes / previous_nodes if previous_nodes else 0.0
+
+    def asDict(self):
+        return {"source": self.source,
+                "depth": self.depth,
+                "nodes": self.nodes,
+                "qsearch_nodes": self.qsearch_nodes,
+                "nps": int(self.nodesPerSecond()),
+                "time_ms": int(self.seconds * 1000),
+                "iteration_ms": [int(seconds * 1000) for depth, score, total_nodes, seconds in self.iterations],
+                "branching_factor": round(self.branchingFactor(), 2),
+                "beta_cutoffs": self.beta_cutoffs,
+                "first_move_cutoff_rate": round(self.first_move_cutoffs / self.beta_cutoffs if self.beta_cutoffs else 0.0, 3),
+                "tt_hits": self.tt_hits,
+                "tt_probes": self.tt_hits + self.tt_misses + self.tt_collisions,
+                "tt_hit_rate": round(self.tt_hits / (self.tt_hits + self.tt_misses + self.tt_collisions)
+                                     if self.tt_hits + self.tt_misses + self.tt_collisions else 0.0, 3),
+                "pv": [move.getUCINotation() for move in self.principal_variation]}
+
+    # One log line, "search" followed by the statistics as JSON
+    def logLine(self):
+        return "search " + json.dumps(self.asDict())
+
+logger = logging.getLogger("ChessAI")
+search_stats = SearchStats()  # Statistics of the last search in this process
+
+# Find the best move with iterative deepening: search depth 1, 2, 3, ... until the time budget runs out
+# and return the best move of the last completed depth
+# stop_event is anything with is_set(), once set the search stops (even at depth 1) and puts None
+# Returns the SearchStats of the decision
+def findBestMove(game_state, valid_moves, return_queue, time_limit_ms=TIME_LIMIT_MS, max_depth=MAX_DEPTH,
+                 stop_event=None):
+    global search_stats
+
+    # Nothing to search with no moves or only one
+    if (len(valid_moves) <= 1):
+        search_stats = SearchStats("only move")
+        logSearchStats()
+        return_queue.put(valid_moves[0] if valid_moves else None)
+        return search_stats
+
+    # Known openings are played straight from the book
+    book_move = ChessBook.probeBook(game_state, valid_moves) if USE_BOOK else None
+    if (book_move is not None):
+        search_stats = SearchStats("book")
+        logSearchStats()
+        return_queue.put(book_move)
+        return search_stats
     random.shuffle(valid_moves)
-    findMoveNegaMaxAlphaBeta(game_state, valid_moves, DEPTH, -CHECKMATE, CHECKMATE,
-                             1 if game_state.white_to_move else -1)
-    return_queue.put(next_move)
+    if (PROFILE_SEARCH):
+        profiler = cProfile.Profile()
+        iterations = profiler.runcall(iterativeDeepening, game_state, valid_moves, time_limit_ms, max_depth, stop_event)
+        profile_text = io.StringIO()
+        pstats.Stats(profiler, stream=profile_text).sort_stats("cumulative").print_stats(PROFILE_LINES)
+        search_stats.profile = profile_text.getvalue()
+        logger.debug(search_stats.profile)
+    else:
+        iterations = iterativeDeepening(game_state, valid_moves, time_limit_ms, max_depth, stop_event)
+    return_queue.put(iterations[-1][1] if iterations else None)
+    return search_stats
+
+# Search the root moves to increasing depths, returns (depth, best move, score) for every completed depth
+# iteration_callback, if given, is called with (depth, best move, score) as soon as each depth completes
+# The statistics of the search end up in search_stats and are logged at info level
+def iterativeDeepening(game_state, root_moves, time_limit_ms=TIME_LIMIT_MS, max_depth=MAX_DEPTH, stop_event=None,
+                       iteration_callback=None):
+    global next_move, search_depth, deadline, search_stopped, principal_variation, nodes, qsearch_nodes, \
+        search_stop_event, search_stats
+    search_stop_event = stop_event
+    max_depth = min(max_depth, MAX_DEPTH)  # Killer moves and the other per-ply tables stop at MAX_DEPTH
+    next_move = None
+    nodes = 0
+    qsearch_nodes = 0
+    principal_variation = []
+    transposition_table.newSearch()
+    resetMoveOrdering()
+    start_time = time.perf_counter()
+    deadline = start_time + time_limit_ms / 1000
+    turn_multiplier = 1 if game_state.white_to_move else -1
+    search_stats = SearchStats()
+
+    # Tablebase endgames need no search, the table already knows the best move
+    tablebase_move = tablebaseMove(game_state, root_moves) if USE_TABLEBASES else None
+    if (tablebase_move is not None):
+        search_depth = 1
+        principal_variation = [tablebase_move[0]]
+        search_stats.source = "tablebase"
+        finishSearchStats(start_time)
+        return [(1, tablebase_move[0], tablebase_move[1])]
+
+    iterations = []
+    for depth in range(1, max_depth + 1):
+        search_depth = depth
+        search_stopped = False
+        next_move = None
+        score = findMoveNegaMaxAlphaBeta(game_state, root_moves, depth, -CHECKMATE, CHECKMATE, turn_multiplier)
+        if (search_stopped):
+            break
+
+        # Every move loses to mate, just keep the first one searched
+        iterations.append((depth, next_move if next_move is not None else root_moves[0], score))
+
+        # The table keeps the best root move, so the next depth searches it first
+        principal_variation = getPrincipalVariation(game_state, depth)
+        search_stats.iterations.append((depth, score, nodes + qsearch_nodes, time.perf_counter() - start_time))
+        if (iteration_callback is not None):
+            iteration_callback(*iterations[-1])
+
+        if (abs(score) >= CHECKMATE or time.perf_counter() >= deadline):
+            break
+    finishSearchStats(start_time)
+    return iterations
+
+# Copy the search counters into search_stats and log them
+def finishSearchStats(start_time):
+
+    search_stats.depth = search_stats.iterations[-1][0] if search_stats.iterations else search_depth
+    search_stats.nodes = nodes
+    search_stats.qsearch_nodes = qsearch_nodes
+    search_stats.beta_cutoffs = beta_cutoffs
+    search_stats.first_move_cutoffs = first_move_cutoffs
+    search_stats.tt_hits = transposition_table.hits
+    search_stats.tt_misses = transposition_table.misses
+    search_stats.tt_collisions = transposition_table.collisions
+    search_stats.seconds = time.perf_counter() - start_time
+    search_stats.principal_variation = list(principal_variation)
+    logSearchStats()
+
+# Log the statistics of the decision at info level, every way of choosing a move ends here
+def logSearchStats():
+
+    if (logger.isEnabledFor(logging.INFO)):
+        logger.info(search_stats.logLine())
+
+# Exact score of a tablebase position for the side to move, None if no table covers it
+def tablebaseScore(game_state):
+
+    result = ChessTablebase.probe(game_state)
+    if (result is None):
+        return None
+    outcome, distance = result
+    return outcome * (TABLEBASE_WIN - distance)
+
+# Best root move by the tablebase as (move, score): the fastest win, a draw, or the slowest loss
+# The score is the move's own, as the search would give it, so root moves split between workers still compare
+# None if the position or one of its moves is not covered by a table
+def tablebaseMove(game_state, root_moves):
+
+    if (tablebaseScore(game_state) is None):
+        return None
+    best = None
+    for move in root_moves:
+        game_state.makeMove(move)
+        score = tablebaseScore(game_state)
+        game_state.undoMove()
+        if (score is None):
+            return None
+        if (best is None or -score > best[1]):
+            best = (move, -score)
+    return best
+
+# Stop flag shared with the pool processes, set to make every worker end its search early
+class SharedStopFlag:
+
+    def __init__(self, value):
+        self.value = value
+
+    def is_set(self):
+        return self.value.value != 0
+
+# Runs once in every pool process, keeps the shared stop flag for searchRootMoves
+def initSearchWorker(stop_value):
+    global search_pool_stop
+    search_pool_stop = stop_value
+
+# Get (or start) the pool of search processes used by findBestMoveParallel
+def getSearchPool(workers):
+    global search_pool, search_pool_size, search_pool_stop
+    if (search_pool is None or search_pool_size != workers):
+        if (search_pool is not None):
+            search_pool.terminate()
+        search_pool_stop = multiprocessing.RawValue("b", 0)
+        search_pool = multiprocessing.Pool(workers, initSearchWorker, (search_pool_stop,))
+        search_pool_size = workers
+    return search_pool
+
+search_pool = None
+search_pool_size = 0
+search_pool_stop = None
+CANCEL_POLL_SECONDS = 0.05  # How often findBestMoveParallel checks its stop_event while the workers search
+
+# Search a subset of the root moves in a pool process, returns plain data so it is cheap to send back
+def searchRootMoves(game_state, root_move_ids, time_limit_ms, max_depth):
+
+    root_moves = [move for move in game_state.getValidMoves() if move.moveID in root_move_ids]
+    stop_event = SharedStopFlag(search_pool_stop) if search_pool_stop is not None else None  # None outside a pool
+    iterations = iterativeDeepening(game_state, root_moves, time_limit_ms, max_depth, stop_event)
+    return {"pid": os.getpid(),
+            "root_moves": len(root_moves),
+            "iterations": [(depth, move.moveID, score) for depth, move, score in iterations],
+            "nodes": nodes,
+            "qsearch_nodes": qsearch_nodes,
+            "first_move_cutoffs": first_move_cutoffs,
+            "stats": search_stats.asDict()}
+
+# Root-parallel search: the root moves are dealt out to a pool of processes that each run iterative deepening
+# on their share, then the best move is picked from the deepest depth every worker completed
+# stop_event works as in findBestMove, once set the workers are told to stop and None is put
+def findBestMoveParallel(game_state, valid_moves, return_queue, workers=PARALLEL_WORKERS, time_limit_ms=TIME_LIMIT_MS,
+                         max_depth=MAX_DEPTH, stop_event=None):
+    global worker_results, search_stats
+
+    worker_results = []
+    if (len(valid_moves) <= 1 or workers <= 1):
+        findBestMove(game_state, valid_moves, return_queue, time_limit_ms, max_depth, stop_event)
+        return worker_results
+
+    book_move = ChessBook.probeBook(game_state, valid_moves) if USE_BOOK else None
+    if (book_move is not None):
+        search_stats = SearchStats("book")
+        logSearchStats()
+        return_queue.put(book_move)
+        return worker_results
+    start_time = time.perf_counter()
+
+    # Deal the moves out in ordering order so every worker gets some of the promising ones
+    ordered_moves = orderMoves(valid_moves, None, 0)
+    workers = min(workers, len(ordered_moves))
+    move_groups = [[move.moveID for move in ordered_moves[i::workers]] for i in range(workers)]
+    pool = getSearchPool(workers)
+    search_pool_stop.value = 0
+    pending = pool.starmap_async(searchRootMoves, [(game_state, group, time_limit_ms, max_depth) for group in move_groups])
+    while (not pending.ready()):
+        pending.wait(CANCEL_POLL_SECONDS)
+        if (stop_event is not None and stop_event.is_set()):
+            search_pool_stop.value = 1
+    worker_results = pending.get()
+    if (stop_event is not None and stop_event.is_set()):
+        search_stats = SearchStats("parallel search")
+        search_stats.seconds = time.perf_counter() - start_time
+        logSearchStats()
+        return_queue.put(None)
+        return worker_results
+
+    # Merge in a fixed order: a mate wins outright, otherwise the best score at the deepest common depth,
+    # ties going to the move that was ordered first
+    # A worker that found a mate either way stopped deepening early, its last score is exact and is compared as it is
+    # instead of holding every other worker back to its depth
+    move_rank = {move.moveID: rank for rank, move in enumerate(ordered_moves)}
+    completed = [result["iterations"] for result in worker_results if result["iterations"]]
+    open_depths = [iterations[-1][0] for iterations in completed if abs(iterations[-1][2]) < CHECKMATE]
+    common_depth = min(open_depths) if open_depths else max(iterations[-1][0] for iterations in completed)
+    candidates = []
+    for result in worker_results:
+        iterations = result["iterations"]
+        if (not iterations):
+            continue
+        proven = abs(iterations[-1][2]) >= CHECKMATE
+        depth, move_id, score = iterations[-1] if proven else iterations[common_depth - 1]
+        candidates.append((score >= CHECKMATE, score, -move_rank[move_id], move_id, result["stats"]["pv"]))
+    best_move_id, best_line = max(candidates)[3:]
+
+    # Totals over the workers, the per-worker statistics stay in worker_results
+    search_stats = SearchStats("parallel search")
+    search_stats.depth = common_depth
+    search_stats.nodes = sum(result["nodes"] for result in worker_results)
+    search_stats.qsearch_nodes = sum(result["qsearch_nodes"] for result in worker_results)
+    search_stats.beta_cutoffs = sum(result["stats"]["beta_cutoffs"] for result in worker_results)
+    search_stats.first_move_cutoffs = sum(result["first_move_cutoffs"] for result in worker_results)
+    search_stats.tt_hits = sum(result["stats"]["tt_hits"] for result in worker_results)
+    search_stats.tt_misses = sum(result["stats"]["tt_probes"] for result in worker_results) - search_stats.tt_hits
+    search_stats.seconds = time.perf_counter() - start_time
+    search_stats.principal_variation = principalVariationFromNotation(game_state, best_line, best_move_id)
+    logSearchStats()
+    return_queue.put(next(move for move in valid_moves if move.moveID == best_move_id))
+    return worker_results
+
+# Turn a worker's principal variation back into moves, it only counts if it starts with the chosen move
+# (a worker's line is from its deepest depth, the move is chosen at the common depth)
+def principalVariationFromNotation(game_state, notations, first_move_id):
+
+    line = []
+    for notation in notations:
+        move = game_state.getValidMoves(indexed=True).findUCIMove(notation)
+        if (move is None or (not line and move.moveID != first_move_id)):
+            break
+        line.append(move)
+        game_state.makeMove(move)
+    for _ in range(len(line)):
+        game_state.undoMove()
+    return line
+
+# Follow the best moves stored in the transposition table from the current position
+def getPrincipalVariation(game_state, max_length):
+
+    line = []
+    for _ in range(max_length):
+        entry = transposition_table.probe(game_state.zobrist_key)
+        if (entry is None or entry[3] is None):
+            break
+        move = None
+        for valid_move in game_state.getValidMoves():
+            if (valid_move.moveID == entry[3]):
+                move = valid_move
+                break
+        if (move is None):
+            break
+        line.append(move)
+        game_state.makeMove(move)
+    for _ in range(len(line)):
+        game_state.undoMove()
+    return line
+
+# The search stops when it is cancelled or, after depth 1, when the time budget is used up
+def searchShouldStop():
+
+    if (search_stop_event is not None and search_stop_event.is_set()):
+        return True
+    return search_depth > 1 and time.perf_counter() >= deadline
+
+search_stop_event = None
+search_depth = 0
+nodes = 0
+qsearch_nodes = 0
 
 # NegaMax with Alpha Beta Pruning
 def findMoveNegaMaxAlphaBeta(game_state, valid_moves, depth, alpha, beta, turn_multiplier):
-    global next_move
-    if (depth == 0):
-        return turn_multiplier * scoreBoard(game_state)
+    global next_move, search_stopped, beta_cutoffs, first_move_cutoffs, nodes
+    nodes += 1
+
+    # Out of time, the caller throws away the unfinished iteration (depth 1 always finishes so there is a move)
+    if (searchShouldStop()):
+        search_stopped = True
+        return 0
+
+    # Drawn positions: stalemate, the fifty-move rule, or a repeated position since a cycle can go on forever
+    # (never at the root, which has to pick a move)
+    if (depth != search_depth and not game_state.checkmate and
+            (game_state.stalemate or game_state.isFiftyMoveDraw() or game_state.isRepetition())):
+        return STALEMATE
+
+    # Exact result from an endgame tablebase (checkmates keep their own score)
+    if (depth != search_depth and USE_TABLEBASES and not game_state.checkmate):
+        score = tablebaseScore(game_state)
+        if (score is not None):
+            return score
+
+    # Reuse the result of an earlier search of this position (never at the root, which has to set next_move)
+    key = game_state.zobrist_key
+    alpha_original = alpha
+    tt_move_id = None
+    entry = transposition_table.probe(key)
+    if (entry is not None):
+        entry_depth, entry_flag, entry_score, tt_move_id = entry
+        if (entry_depth >= depth and depth != search_depth):
+            if (entry_flag == EXACT):
+                return entry_score
+            elif (entry_flag == LOWER_BOUND):
+                alpha = max(alpha, entry_score)
+            elif (entry_flag == UPPER_BOUND):
+                beta = min(beta, entry_score)
+            if (alpha >= beta):
+                return entry_score
+
     max_score = -CHECKMATE
-    for move in valid_moves:
+    best_move = None
+    ply = search_depth - depth
+
+    # Leaves are resolved by the quiescence search and stored too, most transpositions at shallow depths end up there
+    if (depth == 0):
+        max_score = quiescenceSearch(game_state, valid_moves, alpha, beta, turn_multiplier)
+        if (search_stopped):
+            return 0
+        valid_moves = []
+
+    for move_number, move in enumerate(orderMoves(valid_moves, tt_move_id, ply)):
         game_state.makeMove(move)
         next_moves = game_state.getValidMoves()
         score = -findMoveNegaMaxAlphaBeta(game_state, next_moves, depth - 1, -beta, -alpha, -turn_multiplier)
+        game_state.undoMove()
+        if (search_stopped):
+            return 0
         if (score > max_score):
             max_score = score
-            if (depth == DEPTH):
+            best_move = move
+            if (depth == search_depth):
                 next_move = move
+        if (max_score > alpha):
+            alpha = max_score
+        if (alpha >= beta):
+            beta_cutoffs += 1
+            if (move_number == 0):
+                first_move_cutoffs += 1
+            if (not move.is_capture):
+                storeCutoffMove(move, depth, ply)
+            break
+
+    # Checkmate and stalemate scores are already exact, only store searched positions
+    if (best_move is not None or depth == 0):
+        if (max_score <= alpha_original):
+            flag = UPPER_BOUND
+        elif (max_score >= beta):
+            flag = LOWER_BOUND
+        else:
+            flag = EXACT
+        transposition_table.store(key, depth, flag, max_score, best_move.moveID if best_move else None)
+    return max_score
+
+# Search only captures and promotions until the position is quiet, so leaves are not scored in the middle of an exchange
+def quiescenceSearch(game_state, valid_moves, alpha, beta, turn_multiplier):
+    global search_stopped, qsearch_nodes
+    qsearch_nodes += 1
+    if (searchShouldStop()):
+        search_stopped = True
+        return 0
+
+    # Stand pat: the side to move can usually do at least as well as the static score by not capturing
+    stand_pat = turn_multiplier * scoreBoard(game_state)
+    if (len(valid_moves) == 0 or stand_pat >= beta):
+        return stand_pat
+    if (stand_pat > alpha):
+        alpha = stand_pat
+
+    tactical_moves = [move for move in valid_moves if move.is_capture or move.is_pawn_promotion]
+    tactical_moves.sort(key=lambda move: mvvLva(move) if move.is_capture else ChessScores.piece_score["Q"], reverse=True)
+    max_score = stand_pat
+    for move in tactical_moves:
+
+        # Delta pruning: even winning the captured piece for free would not reach alpha
+        gain = ChessScores.piece_score[move.piece_captured[1]] if move.is_capture else 0
+        if (move.is_pawn_promotion):
+            gain += ChessScores.piece_score["Q"] - ChessScores.piece_score["p"]
+        if (stand_pat + gain + DELTA_MARGIN <= alpha):
+            continue
+
+        game_state.makeMove(move)
+        next_moves = game_state.getValidMoves()
+        score = -quiescenceSearch(game_state, next_moves, -beta, -alpha, -turn_multiplier)
         game_state.undoMove()
+        if (search_stopped):
+            return 0
+        if (score > max_score):
+            max_score = score
         if (max_score > alpha):
             alpha = max_score
         if (alpha >= beta):
@@ -114,8 +646,20 @@ def scoreBoard(game_state):
             # White wins
             return CHECKMATE  
         
-    elif (game_state.stalemate):
+    elif (game_state.stalemate or game_state.draw):
         return STALEMATE
+
+    # Material and position scores are maintained incrementally by the game state
+    if (DEBUG_EVALUATION):
+        full_score = fullScoreBoard(game_state)
+        if (abs(full_score - game_state.evaluation) > 1e-6):
+            raise ValueError("Incremental evaluation " + str(game_state.evaluation) + " does not match " +
+                             str(full_score) + " after " + " ".join(str(move) for move in game_state.move_log))
+    return game_state.evaluation
+
+# Score the material and position of every piece on the board from scratch
+def fullScoreBoard(game_state):
+
     score = 0
     for row in range(len(game_state.board)):
         for col in range(len(game_state.board[row])):
@@ -123,11 +667,11 @@ def scoreBoard(game_state):
             if (piece != "--"):
                 piece_position_score = 0
                 if (piece[1] != "K"):
-                    piece_position_score = piece_position_scores[piece][row][col]
+                    piece_position_score = ChessScores.piece_position_scores[piece][row][col]
                 if (piece[0] == "w"):
-                    score += piece_score[piece[1]] + piece_position_score
+                    score += ChessScores.piece_score[piece[1]] + piece_position_score
                 if (piece[0] == "b"):
-                    score -= piece_score[piece[1]] + piece_position_score
+                    score -= ChessScores.piece_score[piece[1]] + piece_position_score
 
     return score
 
@@ -0,0 +1,167 @@
+"""
+Moksh S. GHP Project 2024
+ChessBatch.py
+Batch analysis of many positions: reads FEN lines or PGN games from a file or stdin, searches every position
+in a pool of processes and writes one JSON line per position as soon as it is done
+Only a fixed number of positions are in flight at once, so memory stays flat however long the input is
+"""
+
+# Importing the required libraries
+import argparse
+import itertools
+import json
+import multiprocessing
+import sys
+import threading
+import time
+import ChessAI, ChessBitboard, ChessPGN, ChessUCI, ChessWorker
+
+IN_FLIGHT_PER_WORKER = 4  # Positions queued per worker process before reading more input
+
+
+# Analysis jobs from FEN lines, one per non-empty line (anything after the FEN fields is ignored)
+def readFENJobs(lines):
+
+    for line_number, line in enumerate(lines, 1):
+        fields = line.split()
+        if (not fields or fields[0].startswith("#")):
+            continue
+        yield {"id": str(line_number), "fen": " ".join(fields[:6]), "moves": []}
+
+# Analysis jobs from PGN games, either every position of each game or only the final one
+# A job carries the game's start FEN and the moves up to it, so the worker sees the game history
+def readPGNJobs(lines, every_ply):
+
+    for game_number, (tags, san_moves) in enumerate(ChessPGN.readGames(lines), 1):
+        try:
+            game_state = ChessBitboard.BitboardGameState(tags.get("FEN"))
+        except ValueError as exception:
+            yield {"id": str(game_number) + ":error", "error": str(exception)}
+            continue
+        moves = []
+        error = None
+        for san in san_moves:
+            if (every_ply):
+                yield {"id": str(game_number) + ":" + str(len(moves)), "fen": game_state.start_fen, "moves": list(moves)}
+            try:
+                move = ChessPGN.parseSAN(game_state, san)
+            except ValueError as exception:
+                error = str(exception)
+                break
+            game_state.makeMove(move)
+            moves.append(move.getUCINotation())
+        if (error is not None):
+
+            # With every ply the position before the bad move already went out under its own id
+            yield {"id": str(game_number) + ":error", "error": error}
+        else:
+            yield {"id": str(game_number) + ":" + str(len(moves)), "fen": game_state.start_fen, "moves": moves}
+
+# Search one position in a pool process, returns the JSON-ready result
+def analysePosition(job, max_depth, time_limit_ms, include_stats=False):
+
+    result = {"id": job["id"]}
+    if ("error" in job):
+        result["error"] = job["error"]
+        return result
+    try:
+        game_state = ChessBitboard.BitboardGameState(job["fen"])
+        for notation in job["moves"]:
+            game_state.makeMove(ChessWorker.findMoveByNotation(game_state, notation))
+    except ValueError as exception:
+        result["error"] = str(exception)
+        return result
+    result["fen"] = game_state.getFEN()
+
+    start_time = time.perf_counter()
+    valid_moves = game_state.getValidMoves()
+    if (len(valid_moves) == 0):
+        result["bestmove"] = None
+        result["score"] = "mate 0" if game_state.checkmate else "cp 0"
+        return result
+    iterations = ChessAI.iterativeDeepening(game_state, valid_moves, time_limit_ms, max_depth)
+    elapsed = time.perf_counter() - start_time
+    depth, best_move, score = iterations[-1]
+    principal_variation = ChessAI.principal_variation or [best_move]
+    result["bestmove"] = best_move.getUCINotation()
+    result["score"] = ChessUCI.formatScore(score, principal_variation)
+    result["depth"] = depth
+    result["nodes"] = ChessAI.nodes + ChessAI.qsearch_nodes
+    result["time_ms"] = int(elapsed * 1000)
+    result["pv"] = [move.getUCINotation() for move in principal_variation]
+    if (include_stats):
+        result["stats"] = ChessAI.search_stats.asDict()
+    return result
+
+# Pool entry point, imap only passes one argument
+# Anything that goes wrong in one position becomes that position's error, the rest of the batch carries on
+def analyseJob(arguments):
+
+    try:
+        return analysePosition(*arguments)
+    except Exception as exception:
+        return {"id": arguments[0]["id"], "error": type(exception).__name__ + ": " + str(exception)}
+
+# Work out the input format from the first line that is not blank
+def detectFormat(first_line):
+    return "pgn" if first_line.lstrip().startswith(("[", "1.")) else "fen"
+
+# Wrap a job iterator so it waits for a free slot before handing out the next job
+# The pool's feeder thread reads jobs as fast as it can, this keeps it from reading the whole input into memory
+def throttle(jobs, slots):
+
+    for job in jobs:
+        slots.acquire()
+        yield job
+
+def main(argv=None, input_stream=sys.stdin, output=sys.stdout):
+
+    parser = argparse.ArgumentParser(description="Search every position of a FEN or PGN file and write JSON lines")
+    parser.add_argument("input", nargs="?", default="-", help="FEN or PGN file, - for stdin (default: -)")
+    parser.add_argument("--format", choices=["auto", "fen", "pgn"], default="auto", help="input format (default: auto)")
+    parser.add_argument("--every-ply", action="store_true", help="analyse every position of each PGN game, not just the last")
+    parser.add_argument("--depth", type=int, default=ChessAI.MAX_DEPTH, help="deepest search per position")
+    parser.add_argument("--movetime", type=int, help="time per position in milliseconds "
+                        "(default: no limit with --depth, otherwise " + str(ChessAI.TIME_LIMIT_MS) + ")")
+    parser.add_argument("--stats", action="store_true", help="add the full search statistics to every result")
+    parser.add_argument("--workers", type=int, default=ChessAI.PARALLEL_WORKERS,
+                        help="search processes (default: " + str(ChessAI.PARALLEL_WORKERS) + ")")
+    args = parser.parse_args(argv)
+    if (args.movetime is not None):
+        time_limit_ms = args.movetime
+    elif (args.depth != ChessAI.MAX_DEPTH):
+        time_limit_ms = float("inf")
+    else:
+        time_limit_ms = ChessAI.TIME_LIMIT_MS
+
+    input_file = input_stream if args.input == "-" else open(args.input)
+    try:
+
+        # Peek at the first line for the format and put it back in front of the rest
+        lines = iter(input_file)
+        first_lines = []
+        for line in lines:
+            first_lines.append(line)
+            if (line.strip()):
+                break
+        input_format = args.format
+        if (input_format == "auto"):
+            input_format = detectFormat(first_lines[-1]) if first_lines else "fen"
+        lines = itertools.chain(first_lines, lines)
+        jobs = readPGNJobs(lines, args.every_ply) if input_format == "pgn" else readFENJobs(lines)
+
+        workers = max(1, args.workers)
+        slots = threading.Semaphore(workers * IN_FLIGHT_PER_WORKER)
+        tasks = ((job, args.depth, time_limit_ms, args.stats) for job in throttle(jobs, slots))
+        with multiprocessing.Pool(workers) as pool:
+            for result in pool.imap_unordered(analyseJob, tasks):
+                slots.release()
+                output.write(json.dumps(result) + "\n")
+                output.flush()
+    finally:
+        if (input_file is not input_stream):
+            input_file.close()
+    return 0
+
+if (__name__ == "__main__"):
+    sys.exit(main())
@@ -0,0 +1,87 @@
+"""
+Moksh S. GHP Project 2024
+ChessBench.py
+Perft benchmark for the move generators
+Runs a fixed set of positions, checks the node counts against known values and reports nodes per second
+"""
+
+# Importing the required libraries
+import argparse
+import sys
+import time
+import ChessEngine, ChessBitboard
+
+# Benchmark positions and their perft counts for depth 1, 2, 3, ...
+# The engine always promotes to a queen, so counts for positions with promotions only include queen promotions
+BENCHMARK_POSITIONS = [
+    ("Start position", "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1", [20, 400, 8902, 197281]),
+    ("Kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1", [48, 2039, 97862]),
+    ("Rook endgame", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1", [14, 191, 2812, 43238]),
+    ("Promotions and checks", "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1", [6, 228, 8087]),
+    ("Promotion capture", "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8", [41, 1373, 54007]),
+    ("Middlegame", "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10", [46, 2079, 89890]),
+    ("En passant pin", "8/8/8/8/k2Pp2Q/8/8/3K4 b - d3 0 1", [6, 136, 863, 20471]),
+    ("En passant out of check", "8/8/8/2k5/3Pp3/8/8/4K2R b - d3 0 1", [9, 131, 951, 16316]),
+    ("Castling", "r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1", [26, 568, 13744]),
+    ("Promotion race", "8/P1k5/K7/8/8/8/8/8 w - - 0 1", [3, 13, 111, 553, 7461]),
+]
+
+# Game state class and perft method of each backend
+# bitboard-count is the bitboard backend counting the last ply without building its moves, reported on its own row
+# so the plain rows compare the two move generators doing the same work
+BACKENDS = {"list": (ChessEngine.GameState, "perft"),
+            "bitboard": (ChessBitboard.BitboardGameState, "perft"),
+            "bitboard-count": (ChessBitboard.BitboardGameState, "countingPerft")}
+
+
+# Run perft on every benchmark position with one backend, returns (nodes, seconds, failures)
+def runBenchmark(backend, max_depth, output=sys.stdout):
+
+    total_nodes = 0
+    total_time = 0.0
+    failures = 0
+    for name, fen, counts in BENCHMARK_POSITIONS:
+        game_state_class, perft_method = BACKENDS[backend]
+        game_state = game_state_class(fen)
+        perft = getattr(game_state, perft_method)
+        for depth in range(1, min(max_depth, len(counts)) + 1):
+            start_time = time.perf_counter()
+            nodes = perft(depth)
+            elapsed = time.perf_counter() - start_time
+            total_nodes += nodes
+            total_time += elapsed
+            status = "ok" if nodes == counts[depth - 1] else "FAIL (expected " + str(counts[depth - 1]) + ")"
+            if (nodes != counts[depth - 1]):
+                failures += 1
+            print(f"{backend:14} {name:24} depth {depth}  {nodes:>9} nodes  {elapsed:8.3f}s  "
+                  f"{nodes / elapsed if elapsed > 0 else 0:>10.0f} nps  {status}", file=output)
+    return total_nodes, total_time, failures
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description="Perft benchmark and correctness check for the move generators")
+    parser.add_argument("--backend", choices=list(BACKENDS) + ["all"], default="all",
+                        help="move generator to test (default: all)")
+    parser.add_argument("--max-depth", type=int, default=4, help="deepest perft to run on each position (default: 4)")
+    parser.add_argument("--divide", metavar="FEN", help="print the perft count of every move in this position and exit")
+    args = parser.parse_args(argv)
+    backends = list(BACKENDS) if args.backend == "all" else [args.backend]
+
+    if (args.divide):
+        game_state = BACKENDS[backends[-1]][0](args.divide)
+        counts = game_state.divide(args.max_depth)
+        for move in sorted(counts):
+            print(move, counts[move])
+        print("total", sum(counts.values()))
+        return 0
+
+    failures = 0
+    for backend in backends:
+        nodes, seconds, backend_failures = runBenchmark(backend, args.max_depth)
+        failures += backend_failures
+        print(f"{backend:14} total {nodes} nodes in {seconds:.3f}s, {nodes / seconds if seconds > 0 else 0:.0f} nps, "
+              f"{backend_failures} failed")
+    return 1 if failures else 0
+
+if (__name__ == "__main__"):
+    sys.exit(main())
@@ -0,0 +1,457 @@
+"""
+Moksh S. GHP Project 2024
+ChessBitboard.py
+Bitboard backed version of the game state
+Keeps a 64-bit integer for every piece type and colour and generates legal moves with precomputed attack tables
+"""
+
+# Importing the required libraries
+import ChessEngine
+
+# Square index is row * 8 + col, so bit 0 is a8 and bit 63 is h1 (same orientation as GameState.board)
+PIECES = ("wp", "wN", "wB", "wR", "wQ", "wK", "bp", "bN", "bB", "bR", "bQ", "bK")
+FULL_BOARD = (1 << 64) - 1
+SQUARE_TO_COORD = [divmod(square, 8) for square in range(64)]
+
+# Sliding directions, the first four are orthogonal and the last four are diagonal
+DIRECTIONS = ((-1, 0), (0, -1), (1, 0), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1))
+ROOK_DIRECTIONS = (0, 1, 2, 3)
+BISHOP_DIRECTIONS = (4, 5, 6, 7)
+
+# A direction is positive when it moves towards higher square indices
+POSITIVE_DIRECTION = tuple(d_row > 0 or (d_row == 0 and d_col > 0) for d_row, d_col in DIRECTIONS)
+
+
+# Build a table with the attacked squares of a non-sliding piece for every square
+def buildLeaperTable(offsets):
+
+    table = []
+    for square in range(64):
+        row, col = SQUARE_TO_COORD[square]
+        attacks = 0
+        for d_row, d_col in offsets:
+            end_row = row + d_row
+            end_col = col + d_col
+            if (0 <= end_row <= 7 and 0 <= end_col <= 7):
+                attacks |= 1 << (end_row * 8 + end_col)
+        table.append(attacks)
+    return table
+
+# Build the rays for every direction and square, a ray does not include its starting square
+def buildRayTable():
+
+    rays = []
+    for d_row, d_col in DIRECTIONS:
+        direction_rays = []
+        for square in range(64):
+            row, col = SQUARE_TO_COORD[square]
+            ray = 0
+            for i in range(1, 8):
+                end_row = row + d_row * i
+                end_col = col + d_col * i
+                if (not (0 <= end_row <= 7 and 0 <= end_col <= 7)):
+                    break
+                ray |= 1 << (end_row * 8 + end_col)
+            direction_rays.append(ray)
+        rays.append(direction_rays)
+    return rays
+
+# Build the table of squares strictly between two aligned squares (0 if the squares are not aligned)
+def buildBetweenTable():
+
+    between = [[0] * 64 for _ in range(64)]
+    for square in range(64):
+        row, col = SQUARE_TO_COORD[square]
+        for d_row, d_col in DIRECTIONS:
+            squares_between = 0
+            for i in range(1, 8):
+                end_row = row + d_row * i
+                end_col = col + d_col * i
+                if (not (0 <= end_row <= 7 and 0 <= end_col <= 7)):
+                    break
+                end_square = end_row * 8 + end_col
+                between[square][end_square] = squares_between
+                squares_between |= 1 << end_square
+    return between
+
+KNIGHT_ATTACKS = buildLeaperTable(((-2, -1), (-2, 1), (-1, 2), (1, 2), (2, -1), (2, 1), (-1, -2), (1, -2)))
+KING_ATTACKS = buildLeaperTable(((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)))
+
+# Squares attacked by a pawn of the given colour standing on a square
+PAWN_ATTACKS = {"w": buildLeaperTable(((-1, -1), (-1, 1))), "b": buildLeaperTable(((1, -1), (1, 1)))}
+RAYS = buildRayTable()
+BETWEEN = buildBetweenTable()
+
+# Moves already built, per start square and keyed by (piece moved, end square, piece captured), see addMoves
+MOVE_CACHE = [{} for _ in range(64)]
+
+# Castling data: (rights attribute, king from, king to, rook square, squares that must be empty, squares the king crosses)
+CASTLES = {"w": (("wks", 60, 62, 63, (61, 62), (61, 62)), ("wqs", 60, 58, 56, (57, 58, 59), (58, 59))),
+           "b": (("bks", 4, 6, 7, (5, 6), (5, 6)), ("bqs", 4, 2, 0, (1, 2, 3), (2, 3)))}
+
+
+# Attacks of a sliding piece on a square given the occupancy of the board, found by scanning every ray
+def slidingAttacks(square, occupancy, directions):
+
+    attacks = 0
+    for direction in directions:
+        ray = RAYS[direction][square]
+        blockers = ray & occupancy
+        if (blockers):
+
+            # Nearest blocker is the lowest bit on positive rays and the highest bit on negative rays
+            if (POSITIVE_DIRECTION[direction]):
+                blocker_square = (blockers & -blockers).bit_length() - 1
+            else:
+                blocker_square = blockers.bit_length() - 1
+            ray ^= RAYS[direction][blocker_square]
+        attacks |= ray
+    return attacks
+
+# Squares whose occupancy can change the attacks from a square, the last square of each ray never blocks anything
+def buildBlockerMasks(directions):
+
+    masks = []
+    for square in range(64):
+        mask = 0
+        for direction in directions:
+            ray = RAYS[direction][square]
+            if (ray):
+                last_bit = 1 << (ray.bit_length() - 1) if POSITIVE_DIRECTION[direction] else ray & -ray
+                mask |= ray ^ last_bit
+        masks.append(mask)
+    return masks
+
+ROOK_BLOCKER_MASKS = buildBlockerMasks(ROOK_DIRECTIONS)
+BISHOP_BLOCKER_MASKS = buildBlockerMasks(BISHOP_DIRECTIONS)
+
+# Attacks already worked out for a square and blocker pattern, filled in as positions come up
+ROOK_ATTACK_CACHE = [{} for _ in range(64)]
+BISHOP_ATTACK_CACHE = [{} for _ in range(64)]
+
+def rookAttacks(square, occupancy):
+
+    blockers = occupancy & ROOK_BLOCKER_MASKS[square]
+    cache = ROOK_ATTACK_CACHE[square]
+    attacks = cache.get(blockers)
+    if (attacks is None):
+        attacks = cache[blockers] = slidingAttacks(square, blockers, ROOK_DIRECTIONS)
+    return attacks
+
+def bishopAttacks(square, occupancy):
+
+    blockers = occupancy & BISHOP_BLOCKER_MASKS[square]
+    cache = BISHOP_ATTACK_CACHE[square]
+    attacks = cache.get(blockers)
+    if (attacks is None):
+        attacks = cache[blockers] = slidingAttacks(square, blockers, BISHOP_DIRECTIONS)
+    return attacks
+
+# Index of the lowest set bit
+def lowestSquare(bitboard):
+    return (bitboard & -bitboard).bit_length() - 1
+
+# Number of set bits (int.bit_count needs Python 3.10)
+if (hasattr(int, "bit_count")):
+    countBits = int.bit_count
+else:
+    def countBits(bitboard):
+        return bin(bitboard).count("1")
+
+
+class BitboardGameState(ChessEngine.GameState):
+
+    # Same starting position (or FEN) as GameState, plus one bitboard per piece
+    def __init__(self, fen=None):
+
+        super().__init__(fen)
+        self.syncBitboards()
+
+    # Set up the position from a FEN string and rebuild the bitboards
+    def loadFEN(self, fen):
+
+        super().loadFEN(fen)
+        self.syncBitboards()
+
+    # Rebuild every bitboard from the 8x8 board
+    def syncBitboards(self):
+
+        self.bitboards = {piece: 0 for piece in PIECES}
+        self.occupancy = {"w": 0, "b": 0}
+        for row in range(8):
+            for col in range(8):
+                piece = self.board[row][col]
+                if (piece != "--"):
+                    bit = 1 << (row * 8 + col)
+                    self.bitboards[piece] |= bit
+                    self.occupancy[piece[0]] |= bit
+
+    # Flip the bits a move changes, the same flips make the move and undo it again
+    def toggleMove(self, move):
+
+        bitboards = self.bitboards
+        occupancy = self.occupancy
+        piece_moved = move.piece_moved
+        color = piece_moved[0]
+        start_bit = 1 << (move.start_row * 8 + move.start_col)
+        end_bit = 1 << (move.end_row * 8 + move.end_col)
+        bitboards[piece_moved] ^= start_bit
+        bitboards[color + "Q" if move.is_pawn_promotion else piece_moved] ^= end_bit
+        occupancy[color] ^= start_bit | end_bit
+        piece_captured = move.piece_captured
+        if (piece_captured != "--"):
+            captured_bit = 1 << (move.start_row * 8 + move.end_col) if move.is_enpassant_move else end_bit
+            bitboards[piece_captured] ^= captured_bit
+            occupancy[piece_captured[0]] ^= captured_bit
+        elif (move.is_castle_move):
+            row_start = move.end_row * 8
+            if (move.end_col - move.start_col == 2):
+                rook_bits = (1 << (row_start + 7)) | (1 << (row_start + 5))
+            else:
+                rook_bits = (1 << row_start) | (1 << (row_start + 3))
+            bitboards[color + "R"] ^= rook_bits
+            occupancy[color] ^= rook_bits
+
+    # Make the move on the board and keep the bitboards in step
+    def makeMove(self, move):
+
+        super().makeMove(move)
+        self.toggleMove(move)
+
+    # Undo the last move on the board and keep the bitboards in step
+    def undoMove(self):
+
+        if (len(self.move_log) != 0):
+            self.toggleMove(self.move_log[-1])
+            super().undoMove()
+
+    # All pieces of the given colour attacking a square
+    def attackersTo(self, square, color, occupancy):
+
+        bitboards = self.bitboards
+        queens = bitboards[color + "Q"]
+        enemy = "b" if color == "w" else "w"
+        return ((KNIGHT_ATTACKS[square] & bitboards[color + "N"]) |
+                (KING_ATTACKS[square] & bitboards[color + "K"]) |
+                (PAWN_ATTACKS[enemy][square] & bitboards[color + "p"]) |
+                (bishopAttacks(square, occupancy) & (bitboards[color + "B"] | queens)) |
+                (rookAttacks(square, occupancy) & (bitboards[color + "R"] | queens)))
+
+    # Determine if the enemy can attack the square
+    def squareUnderAttack(self, row, col):
+
+        enemy_color = "b" if self.white_to_move else "w"
+        occupancy = self.occupancy["w"] | self.occupancy["b"]
+        return self.attackersTo(row * 8 + col, enemy_color, occupancy) != 0
+
+    # Determine if the current player is in check
+    def inCheck(self):
+
+        ally_color = "w" if self.white_to_move else "b"
+        return self.squareUnderAttack(*SQUARE_TO_COORD[lowestSquare(self.bitboards[ally_color + "K"])])
+
+    # Get all the valid moves using pin and check masks instead of trying every move
+    def getValidMoves(self, indexed=False):
+
+        targets, special_moves = self.legalTargets()
+        moves = []
+        for from_square, to_squares in targets:
+            self.addMoves(from_square, to_squares, moves)
+        moves.extend(special_moves)
+        return self.finishValidMoves(moves, indexed)
+
+    # Number of valid moves, counted from the target bitboards without building a Move for each one
+    def countValidMoves(self):
+
+        targets, special_moves = self.legalTargets()
+        count = len(special_moves)
+        for _, to_squares in targets:
+            count += countBits(to_squares)
+        return count
+
+    # Perft with the last ply counted from the target bitboards instead of building its moves
+    # Gives the same counts as perft, but times less than the move generator really costs
+    def countingPerft(self, depth):
+
+        if (depth == 0):
+            return 1
+        if (depth == 1):
+            return self.countValidMoves()
+        nodes = 0
+        for move in self.getValidMoves():
+            self.makeMove(move)
+            nodes += self.countingPerft(depth - 1)
+            self.undoMove()
+        return nodes
+
+    # Legal moves as (from square, bitboard of target squares) pairs, plus the en passant and castle moves
+    def legalTargets(self):
+
+        targets = []
+        special_moves = []
+        board = self.board
+        bitboards = self.bitboards
+        if (self.white_to_move):
+            ally_color, enemy_color, forward, start_rank = "w", "b", -8, 0x00FF000000000000
+        else:
+            ally_color, enemy_color, forward, start_rank = "b", "w", 8, 0xFF00
+        ally_occupancy = self.occupancy[ally_color]
+        enemy_occupancy = self.occupancy[enemy_color]
+        occupancy = ally_occupancy | enemy_occupancy
+        empty = FULL_BOARD ^ occupancy
+
+        king_bit = bitboards[ally_color + "K"]
+        king_square = lowestSquare(king_bit)
+        king_coord = SQUARE_TO_COORD[king_square]
+        checkers = self.attackersTo(king_square, enemy_color, occupancy)
+        self.in_check = checkers != 0
+
+        # Pinned pieces may only move along the line between the king and the pinning piece
+        pin_masks = {}
+        enemy_queens = bitboards[enemy_color + "Q"]
+        snipers = ((rookAttacks(king_square, enemy_occupancy) & (bitboards[enemy_color + "R"] | enemy_queens)) |
+                   (bishopAttacks(king_square, enemy_occupancy) & (bitboards[enemy_color + "B"] | enemy_queens)))
+        while (snipers):
+            sniper_bit = snipers & -snipers
+            snipers ^= sniper_bit
+            line = BETWEEN[king_square][sniper_bit.bit_length() - 1]
+            blockers = line & ally_occupancy
+            if (blockers and blockers & (blockers - 1) == 0):
+                pin_masks[blockers.bit_length() - 1] = line | sniper_bit
+
+        # King moves, the king itself is removed from the occupancy so it cannot hide behind its own square
+        king_targets = KING_ATTACKS[king_square] & ~ally_occupancy
+        safe_targets = king_targets
+        occupancy_without_king = occupancy ^ king_bit
+        while (king_targets):
+            target_bit = king_targets & -king_targets
+            king_targets ^= target_bit
+            if (self.attackersTo(target_bit.bit_length() - 1, enemy_color, occupancy_without_king)):
+                safe_targets ^= target_bit
+        targets.append((king_square, safe_targets))
+
+        # Double check - king has to move
+        if (checkers & (checkers - 1)):
+            return targets, special_moves
+
+        # Squares that resolve a single check: capture the checker or block the line
+        if (checkers):
+            check_mask = checkers | BETWEEN[king_square][checkers.bit_length() - 1]
+        else:
+            check_mask = FULL_BOARD
+        target_mask = ~ally_occupancy & check_mask
+
+        # Knights, a pinned knight can never move
+        knights = bitboards[ally_color + "N"]
+        while (knights):
+            from_bit = knights & -knights
+            knights ^= from_bit
+            from_square = from_bit.bit_length() - 1
+            if (from_square not in pin_masks):
+                targets.append((from_square, KNIGHT_ATTACKS[from_square] & target_mask))
+
+        # Sliding pieces
+        rook_movers = bitboards[ally_color + "R"] | bitboards[ally_color + "Q"]
+        bishop_movers = bitboards[ally_color + "B"] | bitboards[ally_color + "Q"]
+        while (rook_movers):
+            from_bit = rook_movers & -rook_movers
+            rook_movers ^= from_bit
+            from_square = from_bit.bit_length() - 1
+            to_squares = rookAttacks(from_square, occupancy) & target_mask
+            if (from_square in pin_masks):
+                to_squares &= pin_masks[from_square]
+            targets.append((from_square, to_squares))
+        while (bishop_movers):
+            from_bit = bishop_movers & -bishop_movers
+            bishop_movers ^= from_bit
+            from_square = from_bit.bit_length() - 1
+            to_squares = bishopAttacks(from_square, occupancy) & target_mask
+            if (from_square in pin_masks):
+                to_squares &= pin_masks[from_square]
+            targets.append((from_square, to_squares))
+
+        # Pawns
+        pawns = bitboards[ally_color + "p"]
+        while (pawns):
+            from_bit = pawns & -pawns
+            pawns ^= from_bit
+            from_square = from_bit.bit_length() - 1
+            to_squares = PAWN_ATTACKS[ally_color][from_square] & enemy_occupancy
+            push_square = from_square + forward
+            push_bit = 1 << push_square
+            if (push_bit & empty):
+                to_squares |= push_bit
+                if (from_bit & start_rank and (1 << (push_square + forward)) & empty):
+                    to_squares |= 1 << (push_square + forward)
+            to_squares &= check_mask
+            if (from_square in pin_masks):
+                to_squares &= pin_masks[from_square]
+            targets.append((from_square, to_squares))
+
+        # En passant, checked by removing both pawns and looking for any attack on the king
+        if (self.enpassant_possible):
+            ep_row, ep_col = self.enpassant_possible
+            ep_square = ep_row * 8 + ep_col
+            captured_bit = 1 << (ep_square - forward)
+            attackers = PAWN_ATTACKS[enemy_color][ep_square] & bitboards[ally_color + "p"]
+            while (attackers):
+                from_bit = attackers & -attackers
+                attackers ^= from_bit
+                occupancy_after = occupancy ^ from_bit ^ captured_bit ^ (1 << ep_square)
+                if (not self.attackersAfterEnpassant(king_square, enemy_color, occupancy_after, captured_bit)):
+                    special_moves.append(ChessEngine.Move(SQUARE_TO_COORD[from_bit.bit_length() - 1], (ep_row, ep_col),
+                                                          board, is_enpassant_move=True))
+
+        # Castling, only possible when not in check
+        if (not checkers):
+            for right, king_from, king_to, rook_from, empty_squares, king_path in CASTLES[ally_color]:
+                if (getattr(self.current_castling_rights, right) and king_square == king_from and
+                        bitboards[ally_color + "R"] & (1 << rook_from)):
+                    if (all(empty & (1 << square) for square in empty_squares) and
+                            not any(self.attackersTo(square, enemy_color, occupancy) for square in king_path)):
+                        special_moves.append(ChessEngine.Move(king_coord, SQUARE_TO_COORD[king_to], board, is_castle_move=True))
+
+        return targets, special_moves
+
+    # Attackers of the king once an en passant capture has removed the captured pawn
+    def attackersAfterEnpassant(self, king_square, enemy_color, occupancy, captured_bit):
+
+        bitboards = self.bitboards
+        queens = bitboards[enemy_color + "Q"]
+        ally_color = "b" if enemy_color == "w" else "w"
+        return ((KNIGHT_ATTACKS[king_square] & bitboards[enemy_color + "N"]) |
+                (PAWN_ATTACKS[ally_color][king_square] & bitboards[enemy_color + "p"] & ~captured_bit) |
+                (bishopAttacks(king_square, occupancy) & (bitboards[enemy_color + "B"] | queens)) |
+                (rookAttacks(king_square, occupancy) & (bitboards[enemy_color + "R"] | queens)))
+
+    # Turn a bitboard of target squares into moves from one square
+    # A Move never changes once built, so the same one is handed out every time the same piece makes the same move
+    def addMoves(self, from_square, targets, moves):
+
+        board = self.board
+        start = SQUARE_TO_COORD[from_square]
+        cache = MOVE_CACHE[from_square]
+        piece_moved = board[start[0]][start[1]]
+        while (targets):
+            target_bit = targets & -targets
+            targets ^= target_bit
+            end = SQUARE_TO_COORD[target_bit.bit_length() - 1]
+            key = (piece_moved, end, board[end[0]][end[1]])
+            move = cache.get(key)
+            if (move is None):
+                move = cache[key] = ChessEngine.Move(start, end, board)
+            moves.append(move)
+
+    # Set the checkmate, stalemate and draw flags the same way GameState does
+    def finishValidMoves(self, moves, indexed=False):
+
+        if (len(moves) == 0):
+            if (self.in_check):
+                self.checkmate = True
+            else:
+                self.stalemate = True
+        else:
+            self.checkmate = False
+            self.stalemate = False
+        self.draw = len(moves) != 0 and (self.isFiftyMoveDraw() or self.repetitionCount() >= 3)
+        return ChessEngine.MoveSet(moves) if indexed else moves
@@ -0,0 +1,158 @@
+"""
+Moksh S. GHP Project 2024
+ChessBook.py
+Opening book: compiles PGN games into a sorted binary file of (position hash, move, weight) entries
+and looks positions up with a binary search over the memory-mapped file, so nothing is read up front
+Run it with a PGN file to build a book: python ChessBook.py games.pgn --output book.bin
+"""
+
+# Importing the required libraries
+import argparse
+import mmap
+import os
+import random
+import struct
+import sys
+import ChessBitboard, ChessPGN
+
+BOOK_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "book.bin")  # Book used by the AI if it exists
+BOOK_MAGIC = b"MMBOOK01"
+ENTRY = struct.Struct(">QHH")  # Zobrist key, Move.moveID, weight
+KEY = struct.Struct(">Q")
+MAX_PLIES = 20  # Moves of each game that go into the book
+# Weight a move gets from how the game went for its side
+# Losses still count a little, otherwise the losing side would have no book moves at all
+RESULT_WEIGHTS = {"win": 4, "draw": 2, "loss": 1, "unknown": 2}
+
+
+# Read-only view of a book file
+class OpeningBook:
+
+    def __init__(self, path):
+
+        self.file = open(path, "rb")
+        self.data = None
+        if (os.fstat(self.file.fileno()).st_size == 0):
+            self.size = 0  # An empty file cannot be mapped, it is an empty book
+            return
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        if (self.data[:len(BOOK_MAGIC)] != BOOK_MAGIC or (len(self.data) - len(BOOK_MAGIC)) % ENTRY.size):
+            self.close()
+            raise ValueError("Not an opening book file: " + path)
+        self.size = (len(self.data) - len(BOOK_MAGIC)) // ENTRY.size
+
+    def close(self):
+        if (self.data is not None):
+            self.data.close()
+        self.file.close()
+
+    def keyAt(self, index):
+        return KEY.unpack_from(self.data, len(BOOK_MAGIC) + index * ENTRY.size)[0]
+
+    # All (move id, weight) entries of a position, found with a binary search for the first entry with this key
+    def probe(self, key):
+
+        low = 0
+        high = self.size
+        while (low < high):
+            middle = (low + high) // 2
+            if (self.keyAt(middle) < key):
+                low = middle + 1
+            else:
+                high = middle
+        entries = []
+        while (low < self.size):
+            entry_key, move_id, weight = ENTRY.unpack_from(self.data, len(BOOK_MAGIC) + low * ENTRY.size)
+            if (entry_key != key):
+                break
+            entries.append((move_id, weight))
+            low += 1
+        return entries
+
+    # Pick a legal book move at random, more often the higher its weight, or None if the position is not in the book
+    def chooseMove(self, game_state, valid_moves, rng=random):
+
+        weights = dict(self.probe(game_state.zobrist_key))
+        candidates = [move for move in valid_moves if weights.get(move.moveID, 0) > 0]
+        if (not candidates):
+            return None
+        return rng.choices(candidates, [weights[move.moveID] for move in candidates])[0]
+
+# Get the book the AI uses, opened on first use, None if there is no book file
+def getBook():
+    global book, book_loaded
+
+    if (not book_loaded):
+        book_loaded = True
+        if (os.path.exists(BOOK_PATH)):
+            book = OpeningBook(BOOK_PATH)
+    return book
+
+book = None
+book_loaded = False
+
+# Book move for the position, None when there is no book or the position is not in it
+def probeBook(game_state, valid_moves):
+
+    opening_book = getBook()
+    if (opening_book is None):
+        return None
+    return opening_book.chooseMove(game_state, valid_moves)
+
+# Count the weight of every (position, move) pair in the first max_plies moves of each game
+def collectBookMoves(lines, max_plies=MAX_PLIES):
+
+    weights = {}
+    games = 0
+    for tags, san_moves in ChessPGN.readGames(lines):
+        result = tags.get("Result", "*")
+        game_state = ChessBitboard.BitboardGameState(tags.get("FEN"))
+        games += 1
+        for san in san_moves[:max_plies]:
+            try:
+                move = ChessPGN.parseSAN(game_state, san)
+            except ValueError:
+                break  # Keep the moves before an unreadable one
+            if (result == "1/2-1/2"):
+                outcome = "draw"
+            elif (result in ("1-0", "0-1")):
+                outcome = "win" if (result == "1-0") == game_state.white_to_move else "loss"
+            else:
+                outcome = "unknown"
+            pair = (game_state.zobrist_key, move.moveID)
+            weights[pair] = weights.get(pair, 0) + RESULT_WEIGHTS[outcome]
+            game_state.makeMove(move)
+    return weights, games
+
+# Write the book file, sorted by key so it can be binary searched
+def writeBook(weights, path, min_weight=1):
+
+    entries = sorted((key, move_id, min(weight, 0xFFFF)) for (key, move_id), weight in weights.items()
+                     if weight >= min_weight)
+    with open(path, "wb") as book_file:
+        book_file.write(BOOK_MAGIC)
+        for entry in entries:
+            book_file.write(ENTRY.pack(*entry))
+    return len(entries)
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description="Build an opening book from PGN games")
+    parser.add_argument("input", help="PGN file, - for stdin")
+    parser.add_argument("--output", default=BOOK_PATH, help="book file to write (default: book.bin next to the engine)")
+    parser.add_argument("--max-plies", type=int, default=MAX_PLIES, help="moves of each game to use (default: 20)")
+    parser.add_argument("--min-weight", type=int, default=1, help="leave out moves with a lower weight (default: 1)")
+    args = parser.parse_args(argv)
+
+    input_file = sys.stdin if args.input == "-" else open(args.input)
+    try:
+        weights, games = collectBookMoves(input_file, args.max_plies)
+    finally:
+        if (input_file is not sys.stdin):
+            input_file.close()
+    entries = writeBook(weights, args.output, args.min_weight)
+    print("Wrote " + str(entries) + " book moves from " + str(games) + " games to " + args.output)
+    return 0
+
+if (__name__ == "__main__"):
+    sys.exit(main())
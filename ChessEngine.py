@@ -5,10 +5,88 @@ Stores all the information about the current state of chess game
 Determines valid moves at current state and keeps a move log
 """
 
+# Importing the required libraries
+import random
+import ChessScores
+
+# Zobrist keys, generated from a fixed seed so every process hashes positions the same way
+zobrist_random = random.Random(2024)
+ZOBRIST_PIECES = {color + piece: [zobrist_random.getrandbits(64) for _ in range(64)]
+                  for color in "wb" for piece in "pRNBQK"}
+ZOBRIST_BLACK_TO_MOVE = zobrist_random.getrandbits(64)
+ZOBRIST_CASTLING = {right: zobrist_random.getrandbits(64) for right in ("wks", "bks", "wqs", "bqs")}
+ZOBRIST_ENPASSANT = [zobrist_random.getrandbits(64) for _ in range(8)]  # One key per file
+
+# Offsets and directions used to look outwards from a square for attackers
+KNIGHT_OFFSETS = ((-2, -1), (-2, 1), (-1, 2), (1, 2), (2, -1), (2, 1), (-1, -2), (1, -2))
+KING_OFFSETS = ((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1))
+ORTHOGONAL_DIRECTIONS = ((-1, 0), (0, -1), (1, 0), (0, 1))
+DIAGONAL_DIRECTIONS = ((-1, -1), (-1, 1), (1, -1), (1, 1))
+
+# Material plus position score of every piece on every square, positive for white
+PIECE_SQUARE_SCORES = ChessScores.buildPieceSquareScores()
+
+# Replace the piece square scores used for the incremental evaluation
+def setPieceSquareScores(scores):
+    for piece in PIECE_SQUARE_SCORES:
+        PIECE_SQUARE_SCORES[piece] = list(scores[piece])
+
+# Look outwards from the square for a piece of the given colour that attacks it
+def isSquareAttacked(board, row, col, enemy_color):
+
+    # Knights
+    enemy_knight = enemy_color + "N"
+    for d_row, d_col in KNIGHT_OFFSETS:
+        end_row = row + d_row
+        end_col = col + d_col
+        if (0 <= end_row <= 7 and 0 <= end_col <= 7 and board[end_row][end_col] == enemy_knight):
+            return True
+
+    # Pawns attack diagonally forwards, so look one row behind the square from the enemy's side
+    pawn_row = row + 1 if enemy_color == "w" else row - 1
+    if (0 <= pawn_row <= 7):
+        enemy_pawn = enemy_color + "p"
+        if (col - 1 >= 0 and board[pawn_row][col - 1] == enemy_pawn):
+            return True
+        if (col + 1 <= 7 and board[pawn_row][col + 1] == enemy_pawn):
+            return True
+
+    # King
+    enemy_king = enemy_color + "K"
+    for d_row, d_col in KING_OFFSETS:
+        end_row = row + d_row
+        end_col = col + d_col
+        if (0 <= end_row <= 7 and 0 <= end_col <= 7 and board[end_row][end_col] == enemy_king):
+            return True
+
+    # Rooks and queens along ranks and files, bishops and queens along diagonals
+    enemy_queen = enemy_color + "Q"
+    for directions, enemy_slider in ((ORTHOGONAL_DIRECTIONS, enemy_color + "R"),
+                                     (DIAGONAL_DIRECTIONS, enemy_color + "B")):
+        for d_row, d_col in directions:
+            end_row = row + d_row
+            end_col = col + d_col
+            while (0 <= end_row <= 7 and 0 <= end_col <= 7):
+                end_piece = board[end_row][end_col]
+                if (end_piece != "--"):
+                    if (end_piece == enemy_slider or end_piece == enemy_queen):
+                        return True
+                    break
+                end_row += d_row
+                end_col += d_col
+    return False
+
+# Forsyth-Edwards Notation of the starting position and the piece letters it uses
+FEN_PIECES = {"p": "p", "r": "R", "n": "N", "b": "B", "q": "Q", "k": "K"}
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+# King and rook home squares for each FEN castling right
+CASTLING_HOME_SQUARES = {"K": ((7, 4), (7, 7)), "Q": ((7, 4), (7, 0)), "k": ((0, 4), (0, 7)), "q": ((0, 4), (0, 0))}
+
 class GameState:
 
-    # Initial board setup
-    def __init__(self):
+    # Initial board setup, or the position of a FEN string if one is given
+    def __init__(self, fen=None):
 
         # Board is an 8x8 list, each element in list has 2 characters that represent pieces
         self.board = [
@@ -30,6 +108,7 @@ class GameState:
         self.black_king_location = (0, 4)
         self.checkmate = False
         self.stalemate = False
+        self.draw = False  # Threefold repetition or fifty-move rule, set by getValidMoves
         self.in_check = False
         self.pins = []
         self.checks = []
@@ -38,6 +117,177 @@ class GameState:
         self.current_castling_rights = CastleRights(True, True, True, True)
         self.castle_rights_log = [CastleRights(self.current_castling_rights.wks, self.current_castling_rights.bks,
                                                self.current_castling_rights.wqs, self.current_castling_rights.bqs)]
+        self.halfmove_clock_log = [0]  # Moves since the last capture or pawn move
+        self.fullmove_number = 1
+        self.start_fen = START_FEN  # Position before the first move in move_log
+        self.zobrist_key_log = [self.computeZobristKey()]
+        self.evaluation_log = [self.computeEvaluation()]
+        if (fen is not None):
+            self.loadFEN(fen)
+
+    # Set up the position from a FEN string, clearing the move log
+    def loadFEN(self, fen):
+
+        fields = fen.split()
+        if (len(fields) < 4 or len(fields) > 6):
+            raise ValueError("FEN needs 4 to 6 fields: " + fen)
+        ranks = fields[0].split("/")
+        if (len(ranks) != 8):
+            raise ValueError("FEN board needs 8 ranks: " + fen)
+
+        board = []
+        for rank in ranks:
+            row = []
+            for char in rank:
+                if (char.isdigit()):
+                    row.extend(["--"] * int(char))
+                elif (char.lower() in FEN_PIECES):
+                    row.append(("w" if char.isupper() else "b") + FEN_PIECES[char.lower()])
+                else:
+                    raise ValueError("Unknown piece '" + char + "' in FEN: " + fen)
+            if (len(row) != 8):
+                raise ValueError("FEN rank '" + rank + "' does not have 8 squares: " + fen)
+            board.append(row)
+        king_locations = {piece: [(row, col) for row in range(8) for col in range(8) if board[row][col] == piece]
+                          for piece in ("wK", "bK")}
+        if (len(king_locations["wK"]) != 1 or len(king_locations["bK"]) != 1):
+            raise ValueError("FEN needs exactly one king of each colour: " + fen)
+        if (fields[1] not in ("w", "b")):
+            raise ValueError("FEN side to move must be 'w' or 'b': " + fen)
+        if (any(piece[1] == "p" for piece in board[0] + board[7])):
+            raise ValueError("FEN has a pawn on the first or last rank: " + fen)
+
+        # The side that just moved cannot have left its king in check, the move generators would capture it
+        waiting_color = "b" if fields[1] == "w" else "w"
+        waiting_king = king_locations[waiting_color + "K"][0]
+        if (isSquareAttacked(board, waiting_king[0], waiting_king[1], fields[1])):
+            raise ValueError("FEN side not to move is in check: " + fen)
+        if (fields[2] != "-" and (not fields[2] or any(char not in "KQkq" for char in fields[2]))):
+            raise ValueError("Invalid FEN castling rights '" + fields[2] + "': " + fen)
+
+        # The en passant square is behind a pawn that just moved two squares, so it depends on who is to move
+        if (fields[3] != "-" and (len(fields[3]) != 2 or fields[3][0] not in Move.files_to_cols or
+                                  fields[3][1] != ("6" if fields[1] == "w" else "3"))):
+            raise ValueError("Invalid FEN en passant square '" + fields[3] + "': " + fen)
+        if (fields[3] != "-"):
+            enpassant_row = Move.ranks_to_rows[fields[3][1]]
+            enpassant_col = Move.files_to_cols[fields[3][0]]
+            pawn_row = enpassant_row + 1 if fields[1] == "w" else enpassant_row - 1
+            if (board[enpassant_row][enpassant_col] != "--" or board[pawn_row][enpassant_col] != waiting_color + "p"):
+                raise ValueError("FEN en passant square '" + fields[3] + "' is not behind a pawn that just moved: " + fen)
+        try:
+            halfmove_clock = int(fields[4]) if len(fields) > 4 else 0
+            fullmove_number = int(fields[5]) if len(fields) > 5 else 1
+        except ValueError:
+            raise ValueError("FEN move counters must be numbers: " + fen)
+
+        self.board = board
+        self.white_to_move = fields[1] == "w"
+        self.white_king_location = king_locations["wK"][0]
+        self.black_king_location = king_locations["bK"][0]
+        self.move_log = []
+        self.checkmate = False
+        self.stalemate = False
+        self.draw = False  # Threefold repetition or fifty-move rule, set by getValidMoves
+        self.in_check = False
+        self.pins = []
+        self.checks = []
+        if (fields[3] == "-"):
+            self.enpassant_possible = ()
+        else:
+            self.enpassant_possible = (Move.ranks_to_rows[fields[3][1]], Move.files_to_cols[fields[3][0]])
+        self.enpassant_possible_log = [self.enpassant_possible]
+
+        # A castling right only counts while its king and rook are still on their home squares
+        rights = ""
+        for right in fields[2].replace("-", ""):
+            (king_row, king_col), (rook_row, rook_col) = CASTLING_HOME_SQUARES[right]
+            color = "w" if right.isupper() else "b"
+            if (board[king_row][king_col] == color + "K" and board[rook_row][rook_col] == color + "R"):
+                rights += right
+        self.current_castling_rights = CastleRights("K" in rights, "k" in rights, "Q" in rights, "q" in rights)
+        self.castle_rights_log = [CastleRights("K" in rights, "k" in rights, "Q" in rights, "q" in rights)]
+        self.halfmove_clock_log = [halfmove_clock]
+        self.fullmove_number = fullmove_number
+        self.start_fen = fen
+        self.zobrist_key_log = [self.computeZobristKey()]
+        self.evaluation_log = [self.computeEvaluation()]
+
+    # Get the FEN string of the current position
+    def getFEN(self):
+
+        ranks = []
+        for row in self.board:
+            rank = ""
+            empty_squares = 0
+            for piece in row:
+                if (piece == "--"):
+                    empty_squares += 1
+                    continue
+                if (empty_squares):
+                    rank += str(empty_squares)
+                    empty_squares = 0
+                letter = "P" if piece[1] == "p" else piece[1]
+                rank += letter if piece[0] == "w" else letter.lower()
+            if (empty_squares):
+                rank += str(empty_squares)
+            ranks.append(rank)
+
+        rights = self.current_castling_rights
+        castling = (("K" if rights.wks else "") + ("Q" if rights.wqs else "") +
+                    ("k" if rights.bks else "") + ("q" if rights.bqs else "")) or "-"
+        if (self.enpassant_possible):
+            enpassant = Move.cols_to_files[self.enpassant_possible[1]] + Move.rows_to_ranks[self.enpassant_possible[0]]
+        else:
+            enpassant = "-"
+        return " ".join(("/".join(ranks), "w" if self.white_to_move else "b", castling, enpassant,
+                         str(self.halfmove_clock_log[-1]), str(self.fullmove_number)))
+
+    # 64-bit hash of the current position, kept up to date by makeMove and undoMove
+    @property
+    def zobrist_key(self):
+        return self.zobrist_key_log[-1]
+
+    # Material and position score of the current position, kept up to date by makeMove and undoMove
+    @property
+    def evaluation(self):
+        return self.evaluation_log[-1]
+
+    # Compute the material and position score from scratch
+    def computeEvaluation(self):
+
+        evaluation = 0
+        for row in range(8):
+            for col in range(8):
+                piece = self.board[row][col]
+                if (piece != "--"):
+                    evaluation += PIECE_SQUARE_SCORES[piece][row * 8 + col]
+        return evaluation
+
+    # Compute the hash of the current position from scratch
+    def computeZobristKey(self):
+
+        key = 0
+        for row in range(8):
+            for col in range(8):
+                piece = self.board[row][col]
+                if (piece != "--"):
+                    key ^= ZOBRIST_PIECES[piece][row * 8 + col]
+        if (not self.white_to_move):
+            key ^= ZOBRIST_BLACK_TO_MOVE
+        key ^= self.castlingZobristKey(self.current_castling_rights)
+        if (self.enpassant_possible):
+            key ^= ZOBRIST_ENPASSANT[self.enpassant_possible[1]]
+        return key
+
+    # Hash of a set of castle rights
+    def castlingZobristKey(self, castle_rights):
+
+        key = 0
+        for right in ("wks", "bks", "wqs", "bqs"):
+            if (getattr(castle_rights, right)):
+                key ^= ZOBRIST_CASTLING[right]
+        return key
 
     # Takes a move as a parameter and executes it
     def makeMove(self, move):
@@ -89,6 +339,43 @@ class GameState:
         self.castle_rights_log.append(CastleRights(self.current_castling_rights.wks, self.current_castling_rights.bks,
                                                    self.current_castling_rights.wqs, self.current_castling_rights.bqs))
 
+        # Update the position hash and evaluation with only what this move changed
+        start_square = move.start_row * 8 + move.start_col
+        end_square = move.end_row * 8 + move.end_col
+        piece_placed = self.board[move.end_row][move.end_col]  # Differs from piece_moved on promotion
+        key = self.zobrist_key_log[-1] ^ ZOBRIST_BLACK_TO_MOVE
+        key ^= ZOBRIST_PIECES[move.piece_moved][start_square] ^ ZOBRIST_PIECES[piece_placed][end_square]
+        evaluation = (self.evaluation_log[-1] - PIECE_SQUARE_SCORES[move.piece_moved][start_square] +
+                      PIECE_SQUARE_SCORES[piece_placed][end_square])
+        if (move.piece_captured != "--"):
+            captured_square = move.start_row * 8 + move.end_col if move.is_enpassant_move else end_square
+            key ^= ZOBRIST_PIECES[move.piece_captured][captured_square]
+            evaluation -= PIECE_SQUARE_SCORES[move.piece_captured][captured_square]
+        if (move.is_castle_move):
+            rook = move.piece_moved[0] + "R"
+            if (move.end_col - move.start_col == 2):
+                rook_from, rook_to = move.end_row * 8 + 7, move.end_row * 8 + 5
+            else:
+                rook_from, rook_to = move.end_row * 8, move.end_row * 8 + 3
+            key ^= ZOBRIST_PIECES[rook][rook_from] ^ ZOBRIST_PIECES[rook][rook_to]
+            evaluation += PIECE_SQUARE_SCORES[rook][rook_to] - PIECE_SQUARE_SCORES[rook][rook_from]
+        previous_enpassant = self.enpassant_possible_log[-2]
+        if (previous_enpassant):
+            key ^= ZOBRIST_ENPASSANT[previous_enpassant[1]]
+        if (self.enpassant_possible):
+            key ^= ZOBRIST_ENPASSANT[self.enpassant_possible[1]]
+        key ^= self.castlingZobristKey(self.castle_rights_log[-2]) ^ self.castlingZobristKey(self.current_castling_rights)
+        self.zobrist_key_log.append(key)
+        self.evaluation_log.append(evaluation)
+
+        # Move counters, the halfmove clock restarts on every capture or pawn move
+        if (move.piece_moved[1] == "p" or move.piece_captured != "--"):
+            self.halfmove_clock_log.append(0)
+        else:
+            self.halfmove_clock_log.append(self.halfmove_clock_log[-1] + 1)
+        if (self.white_to_move):
+            self.fullmove_number += 1
+
     # Undo the last move
     def undoMove(self):
 
@@ -112,10 +399,16 @@ class GameState:
 
             self.enpassant_possible_log.pop()
             self.enpassant_possible = self.enpassant_possible_log[-1]
+            self.zobrist_key_log.pop()
+            self.evaluation_log.pop()
+            self.halfmove_clock_log.pop()
+            if (not self.white_to_move):
+                self.fullmove_number -= 1
 
             # Undo castle rights
             self.castle_rights_log.pop()  # Get rid of the new castle rights from the move we are undoing
-            self.current_castling_rights = self.castle_rights_log[-1]  # Set the current castle rights to the last one in the list
+            last_rights = self.castle_rights_log[-1]  # Set the current castle rights to a copy of the last one in the list
+            self.current_castling_rights = CastleRights(last_rights.wks, last_rights.bks, last_rights.wqs, last_rights.bqs)
 
             # Undo the castle move
             if (move.is_castle_move):
@@ -131,6 +424,32 @@ class GameState:
                     self.board[move.end_row][move.end_col + 1] = '--'
             self.checkmate = False
             self.stalemate = False
+            self.draw = False
+
+    # Count the leaf nodes of the legal move tree to the given depth, used to test and time the move generator
+    def perft(self, depth):
+
+        if (depth == 0):
+            return 1
+        moves = self.getValidMoves()
+        if (depth == 1):
+            return len(moves)
+        nodes = 0
+        for move in moves:
+            self.makeMove(move)
+            nodes += self.perft(depth - 1)
+            self.undoMove()
+        return nodes
+
+    # Perft split by the first move, so a wrong count can be traced to the move that causes it
+    def divide(self, depth):
+
+        counts = {}
+        for move in self.getValidMoves():
+            self.makeMove(move)
+            counts[move.getUCINotation()] = self.perft(depth - 1)
+            self.undoMove()
+        return counts
 
     # Update the castle rights given the move
     def updateCastleRights(self, move):
@@ -165,8 +484,8 @@ class GameState:
                 elif (move.start_col == 7):  # Right rook
                     self.current_castling_rights.bks = False
 
-    # Get all the valid moves 
-    def getValidMoves(self):
+    # Get all the valid moves, as a MoveSet when indexed is set
+    def getValidMoves(self, indexed=False):
 
         temp_castle_rights = CastleRights(self.current_castling_rights.wks, self.current_castling_rights.bks,
                                           self.current_castling_rights.wqs, self.current_castling_rights.bqs)
@@ -208,6 +527,8 @@ class GameState:
                 # Get rid of any moves that don't block check or move king
                 for i in range(len(moves) - 1, -1, -1):  # Iterate through the list backwards when removing elements
                     if (moves[i].piece_moved[1] != "K"):  # Move doesn't move king so it must block or capture
+                        if (moves[i].is_enpassant_move and (moves[i].start_row, moves[i].end_col) == (check_row, check_col)):
+                            continue  # En passant captures the checking pawn without landing on its square
                         if not (moves[i].end_row,
                                 moves[i].end_col) in valid_squares:  # Move doesn't block or capture piece
                             moves.remove(moves[i])
@@ -225,16 +546,38 @@ class GameState:
                 self.getCastleMoves(self.black_king_location[0], self.black_king_location[1], moves)
 
         if (len(moves) == 0):
-            if (self.inCheck()):
+            if (self.in_check):
                 self.checkmate = True
             else:
                 self.stalemate = True
         else:
             self.checkmate = False
             self.stalemate = False
+        self.draw = len(moves) != 0 and (self.isFiftyMoveDraw() or self.repetitionCount() >= 3)
 
         self.current_castling_rights = temp_castle_rights
-        return moves
+        return MoveSet(moves) if indexed else moves
+
+    # Number of times the current position has occurred, including now
+    # Only looks back to the last capture or pawn move, no position before it can come back
+    def repetitionCount(self):
+
+        key = self.zobrist_key_log[-1]
+        last = len(self.zobrist_key_log) - 1
+        oldest = max(0, last - self.halfmove_clock_log[-1])
+        count = 1
+        for i in range(last - 2, oldest - 1, -2):  # Same side to move every second entry
+            if (self.zobrist_key_log[i] == key):
+                count += 1
+        return count
+
+    # The current position already occurred earlier, the search treats this as a draw since the cycle can repeat
+    def isRepetition(self):
+        return self.repetitionCount() >= 2
+
+    # Fifty moves by each side without a capture or pawn move
+    def isFiftyMoveDraw(self):
+        return self.halfmove_clock_log[-1] >= 100
 
     # Determine if the current player is in check
     def inCheck(self):
@@ -246,15 +589,11 @@ class GameState:
 
     # Determine if the enemy can attack the square
     def squareUnderAttack(self, row, col):
+        return self.squareAttackedBy(row, col, "b" if self.white_to_move else "w")
 
-        # Switch to opponent's point of view
-        self.white_to_move = not self.white_to_move  
-        opponents_moves = self.getAllPossibleMoves()
-        self.white_to_move = not self.white_to_move
-        for move in opponents_moves:
-            if (move.end_row == row and move.end_col == col):  # Square is under attack
-                return True
-        return False
+    # Look outwards from the square for a piece of the given colour that attacks it
+    def squareAttackedBy(self, row, col, enemy_color):
+        return isSquareAttacked(self.board, row, col, enemy_color)
 
     # Get all moves without considering checks
     def getAllPossibleMoves(self):
@@ -412,8 +751,9 @@ class GameState:
                             square = self.board[row][i]
                             if (square[0] == enemy_color and (square[1] == "R" or square[1] == "Q")):
                                 attacking_piece = True
+                                break
                             elif (square != "--"):
-                                blocking_piece = True
+                                break  # Only the first piece beyond the pawns can attack the king
                     if (not attacking_piece or blocking_piece):
                         moves.append(Move((row, col), (row + move_amount, col - 1), self.board, is_enpassant_move=True))
 
@@ -446,8 +786,9 @@ class GameState:
                             square = self.board[row][i]
                             if (square[0] == enemy_color and (square[1] == "R" or square[1] == "Q")):
                                 attacking_piece = True
+                                break
                             elif (square != "--"):
-                                blocking_piece = True
+                                break  # Only the first piece beyond the pawns can attack the king
                     if (not attacking_piece or blocking_piece):
                         moves.append(Move((row, col), (row + move_amount, col + 1), self.board, is_enpassant_move=True))
 
@@ -563,46 +904,36 @@ class GameState:
     # Get all the queen's moves
     def getQueenMoves(self, row, col, moves):
 
-        # Queen moves are a combination of rook and bishop moves
-        self.getBishopMoves(row, col, moves)
+        # Queen moves are a combination of rook and bishop moves, rook first because the bishop moves remove the pin
         self.getRookMoves(row, col, moves)
+        self.getBishopMoves(row, col, moves)
 
     # Get all the king's moves
     def getKingMoves(self, row, col, moves):
 
-        #All directions
-        row_moves = (-1, -1, -1, 0, 0, 1, 1, 1)
-        col_moves = (-1, 0, 1, -1, 1, -1, 0, 1)
-
         ally_color = "w" if self.white_to_move else "b"
-        for i in range(8):
-            end_row = row + row_moves[i]
-            end_col = col + col_moves[i]
+        enemy_color = "b" if self.white_to_move else "w"
+
+        # Lift the king off the board so it cannot block a slider's attack on the square behind it
+        king = self.board[row][col]
+        self.board[row][col] = "--"
+        for d_row, d_col in KING_OFFSETS:
+            end_row = row + d_row
+            end_col = col + d_col
             if (0 <= end_row <= 7 and 0 <= end_col <= 7):
                 end_piece = self.board[end_row][end_col]
 
                 # Not an ally piece - empty or enemy
-                if (end_piece[0] != ally_color):  
-
-                    # Place king on end square and check for checks
-                    if (ally_color == "w"):
-                        self.white_king_location = (end_row, end_col)
-                    else:
-                        self.black_king_location = (end_row, end_col)
-                    in_check, pins, checks = self.checkForPinsAndChecks()
-                    if (not in_check):
-                        moves.append(Move((row, col), (end_row, end_col), self.board))
-
-                    # Place king back on original location
-                    if (ally_color == "w"):
-                        self.white_king_location = (row, col)
-                    else:
-                        self.black_king_location = (row, col)
+                if (end_piece[0] != ally_color and not self.squareAttackedBy(end_row, end_col, enemy_color)):
+                    self.board[row][col] = king
+                    moves.append(Move((row, col), (end_row, end_col), self.board))
+                    self.board[row][col] = "--"
+        self.board[row][col] = king
 
     # Get all the castle moves
     def getCastleMoves(self, row, col, moves):
 
-        if (self.squareUnderAttack(row, col)):
+        if (self.in_check):
             return  # Can't castle while in check
         if ((self.white_to_move and self.current_castling_rights.wks) or (
                 not self.white_to_move and self.current_castling_rights.bks)):
@@ -630,6 +961,43 @@ class CastleRights:
         self.wqs = wqs
         self.bqs = bqs
 
+# Valid moves indexed by start square and by (start square, end square), so the GUI and other front ends
+# can look moves up and check legality without scanning the list
+# It is still a list, anything that takes the plain move list takes a MoveSet too
+class MoveSet(list):
+
+    def __init__(self, moves=()):
+
+        super().__init__(moves)
+        self.by_start = {}
+        self.by_squares = {}
+        for move in self:
+            start_square = (move.start_row, move.start_col)
+            self.by_start.setdefault(start_square, []).append(move)
+            self.by_squares[(start_square, (move.end_row, move.end_col))] = move
+
+    # Moves of the piece on a square
+    def movesFrom(self, square):
+        return self.by_start.get(square, [])
+
+    # The valid move between two squares, None if there is none
+    def findMove(self, start_square, end_square):
+        return self.by_squares.get((start_square, end_square))
+
+    # The valid move with the given long algebraic notation, None if there is none
+    # Moves always promote to a queen, so any promotion piece matches a promotion move
+    def findUCIMove(self, notation):
+
+        if (len(notation) < 4 or notation[0] not in Move.files_to_cols or notation[2] not in Move.files_to_cols or
+                notation[1] not in Move.ranks_to_rows or notation[3] not in Move.ranks_to_rows):
+            return None
+        return self.findMove((Move.ranks_to_rows[notation[1]], Move.files_to_cols[notation[0]]),
+                             (Move.ranks_to_rows[notation[3]], Move.files_to_cols[notation[2]]))
+
+    def __contains__(self, move):
+        return isinstance(move, Move) and self.findMove((move.start_row, move.start_col),
+                                                        (move.end_row, move.end_col)) is not None
+
 #Finding the chess algebraic notation of the move based off of rows and columns
 class Move:
 
@@ -640,28 +1008,36 @@ class Move:
                      "e": 4, "f": 5, "g": 6, "h": 7}
     cols_to_files = {v: k for k, v in files_to_cols.items()}
 
+    # Slots instead of a per-move __dict__, the search creates millions of moves
+    __slots__ = ("start_row", "start_col", "end_row", "end_col", "piece_moved", "piece_captured",
+                 "is_pawn_promotion", "is_enpassant_move", "is_castle_move", "is_capture", "moveID")
+
     def __init__(self, start_square, end_square, board, is_enpassant_move=False, is_castle_move=False):
-        self.start_row = start_square[0]
-        self.start_col = start_square[1]
-        self.end_row = end_square[0]
-        self.end_col = end_square[1]
-        self.piece_moved = board[self.start_row][self.start_col]
-        self.piece_captured = board[self.end_row][self.end_col]
+        start_row, start_col = start_square
+        end_row, end_col = end_square
+        self.start_row = start_row
+        self.start_col = start_col
+        self.end_row = end_row
+        self.end_col = end_col
+        piece_moved = self.piece_moved = board[start_row][start_col]
 
         # Pawn promotion
-        self.is_pawn_promotion = (self.piece_moved == "wp" and self.end_row == 0) or (
-                self.piece_moved == "bp" and self.end_row == 7)
-        
+        self.is_pawn_promotion = piece_moved[1] == "p" and (end_row == 0 or end_row == 7)
+
         # En passant
         self.is_enpassant_move = is_enpassant_move
-        if (self.is_enpassant_move):
-            self.piece_captured = "wp" if self.piece_moved == "bp" else "bp"
+        if (is_enpassant_move):
+            self.piece_captured = "wp" if piece_moved == "bp" else "bp"
+        else:
+            self.piece_captured = board[end_row][end_col]
 
         # Castle
         self.is_castle_move = is_castle_move
 
         self.is_capture = self.piece_captured != "--"
-        self.moveID = self.start_row * 1000 + self.start_col * 100 + self.end_row * 10 + self.end_col
+
+        # Start square in the low 6 bits and end square in the next 6 (squares are row * 8 + col)
+        self.moveID = start_row * 8 + start_col + ((end_row * 8 + end_col) << 6)
 
     # Overriding the equals method
     def __eq__(self, other):
@@ -670,6 +1046,10 @@ class Move:
             return self.moveID == other.moveID
         return False
 
+    # Moves with the same start and end square are equal, so they hash the same
+    def __hash__(self):
+        return self.moveID
+
     # Function to get the chess notation of the move
     def getChessNotation(self):
         if (self.is_pawn_promotion):
@@ -694,6 +1074,11 @@ class Move:
             else:
                 return self.piece_moved[1] + self.getRankFile(self.end_row, self.end_col)
 
+    # Function to get the long algebraic notation of the move (e.g. e2e4, e7e8q)
+    def getUCINotation(self):
+        notation = self.getRankFile(self.start_row, self.start_col) + self.getRankFile(self.end_row, self.end_col)
+        return notation + "q" if self.is_pawn_promotion else notation
+
     # Function to get the rank and file of the move
     def getRankFile(self, row, col):
         return self.cols_to_files[col] + self.rows_to_ranks[row]
@@ -9,10 +9,9 @@ This will handle user input and updating the graphics
 from os import environ
 environ['PYGAME_HIDE_SUPPORT_PROMPT'] = '1'
 import pygame as p
-import ChessEngine, ChessAI
+import ChessEngine, ChessAI, ChessBitboard, ChessWorker
 import sys
 import os
-from multiprocessing import Process, Queue
 import tkinter as tk
 from tkinter import filedialog
 
@@ -26,8 +25,17 @@ END_GAME_BUTTON_X = BOARD_WIDTH + 20
 END_GAME_BUTTON_Y = BOARD_HEIGHT - 60
 END_GAME_BUTTON_WIDTH = 200
 END_GAME_BUTTON_HEIGHT = 40
-MAX_FPS = 10
+MAX_FPS = 10  # Start screen only, the game itself waits for events
+ANIMATION_FPS = 60
+ANIMATION_FRAMES_PER_SQUARE = 10
+ENGINE_EVENT = p.USEREVENT + 1  # Posted when the engine process replies
+USE_BITBOARDS = True  # Use the bitboard move generator instead of the 8x8 list one
+AI_WORKERS = 1  # More than 1 splits the AI's root moves across that many processes
+PONDER = True  # Search the expected reply while the human is thinking
 IMAGES = {}
+MOVE_LOG_MOVES_PER_LINE = 3  # Full moves on each line of the move log
+MOVE_LOG_PADDING = 5
+MOVE_LOG_LINE_SPACING = 2
 
 # Main Function
 def main():
@@ -50,8 +58,8 @@ def main():
     player_two = not player_one 
 
     # Initialize the game state and other variables 
-    game_state = ChessEngine.GameState()
-    valid_moves = game_state.getValidMoves()
+    game_state = newGameState()
+    valid_moves = game_state.getValidMoves(indexed=True)  # Indexed for click lookups and highlighting
     move_made = False  # Variable for when a move is made
     animate = False  # Variable for when we should animate a move
     loadImages() 
@@ -60,24 +68,47 @@ def main():
     player_clicks = []  # This will keep track of player clicks (two tuples)
     game_over = False
     ai_thinking = False
-    move_undone = False
-    move_finder_process = None
+    ai_request_id = None
+    ai_response = None  # Engine reply waiting for the last move's animation to finish
+    ponder_move = None  # Human move the AI is pondering on, in long algebraic notation
+    ponder_request_id = None
+    engine = ChessWorker.EngineWorker(USE_BITBOARDS, workers=AI_WORKERS,  # Stays alive for the whole game
+                                      on_response=lambda: p.event.post(p.event.Event(ENGINE_EVENT)))
     move_log_font = p.font.SysFont("Arial", 14, False, False)
+    renderer = BoardRenderer(screen, not player_one, move_log_font)  # Flip the board if player is black
+    pgn_string = ""
+    p.event.set_blocked(p.MOUSEMOTION)  # Nothing follows the mouse, so moving it should not wake the loop
 
     while running:
 
-        # Initialize pgn_string with a default value
-        pgn_string = ""
+        # Sleep until there is an event (input, the engine replying) or the next animation frame is due
+        frame_due = renderer.isAnimating() or ai_response is not None
+        events = [p.event.wait(1000 // ANIMATION_FPS if frame_due else 0)] + p.event.get()
 
         # Determine if it's the human's turn based on player choice
         human_turn = (game_state.white_to_move and player_one) or (not game_state.white_to_move and player_two)
-        for e in p.event.get():
+        for e in events:
             if (e.type == p.QUIT):
+                engine.stop()
                 p.quit()
                 sys.exit()
 
-            # Mouse handler
-            elif (e.type == p.MOUSEBUTTONDOWN):
+            # The window was uncovered, show all of it again
+            elif (e.type == p.WINDOWEXPOSED):
+                renderer.dirty_rects.append(screen.get_rect())
+
+            # Scroll the move log with the mouse wheel
+            elif (e.type == p.MOUSEWHEEL):
+                if (p.mouse.get_pos()[0] >= BOARD_WIDTH):
+                    renderer.move_log_view.scroll(-e.y)
+
+            # Mouse handler, wheel buttons are handled as MOUSEWHEEL
+            elif (e.type == p.MOUSEBUTTONDOWN and e.button <= 3):
+
+                # Check if the end game button is clicked
+                if (game_over and END_GAME_BUTTON_X <= e.pos[0] <= END_GAME_BUTTON_X + END_GAME_BUTTON_WIDTH and
+                        END_GAME_BUTTON_Y <= e.pos[1] <= END_GAME_BUTTON_Y + END_GAME_BUTTON_HEIGHT):
+                    savePGNToFile(pgn_string)
                 if (not game_over):
                     location = p.mouse.get_pos()  # Location of the mouse
                     col = location[0] // SQUARE_SIZE
@@ -89,22 +120,21 @@ def main():
                         col = DIMENSION - 1 - col
 
                     # User clicked the same square twice
-                    if (square_selected == (row, col) or col >= 8):
+                    if (square_selected == (row, col) or location[0] >= BOARD_WIDTH):
                         square_selected = ()  # Deselect
                         player_clicks = []  # Clear clicks
                     else:
                         square_selected = (row, col)
                         player_clicks.append(square_selected)  # Append for both 1st and 2nd click
                     if (len(player_clicks) == 2 and human_turn):  # After 2nd click
-                        move = ChessEngine.Move(player_clicks[0], player_clicks[1], game_state.board)
-                        for i in range(len(valid_moves)):
-                            if (move == valid_moves[i]):
-                                game_state.makeMove(valid_moves[i])
-                                move_made = True
-                                animate = True
-                                square_selected = ()  # Reset user clicks
-                                player_clicks = []
-                        if (not move_made):
+                        move = valid_moves.findMove(player_clicks[0], player_clicks[1])
+                        if (move is not None):
+                            game_state.makeMove(move)
+                            move_made = True
+                            animate = True
+                            square_selected = ()  # Reset user clicks
+                            player_clicks = []
+                        else:
                             player_clicks = [square_selected]
 
             # Key handler
@@ -116,81 +146,119 @@ def main():
                     move_made = True
                     animate = False
                     game_over = False
-                    if (ai_thinking):
-                        move_finder_process.terminate()
+                    if (ai_thinking or ponder_request_id is not None):
+                        engine.cancel()
                         ai_thinking = False
-                    move_undone = True
+                        ai_response = None
+                        ponder_move = ponder_request_id = None
 
                 # Reset the game when 'r' is pressed
                 if (e.key == p.K_r): 
-                    game_state = ChessEngine.GameState()
-                    valid_moves = game_state.getValidMoves()
+                    game_state = newGameState()
+                    valid_moves = game_state.getValidMoves(indexed=True)
                     square_selected = ()
                     player_clicks = []
                     move_made = False
                     animate = False
                     game_over = False
-                    if (ai_thinking):
-                        move_finder_process.terminate()
+                    if (ai_thinking or ponder_request_id is not None):
+                        engine.cancel()
                         ai_thinking = False
-                    move_undone = True
-
-                elif e.type == p.MOUSEBUTTONDOWN:
-                    mouse_x, mouse_y = p.mouse.get_pos()
-                    
-                    # Check if the end game button is clicked
-                    if (END_GAME_BUTTON_X <= mouse_x <= END_GAME_BUTTON_X + END_GAME_BUTTON_WIDTH and
-                        END_GAME_BUTTON_Y <= mouse_y <= END_GAME_BUTTON_Y + END_GAME_BUTTON_HEIGHT):
-                        savePGNToFile(pgn_string)
-
-        if (not game_over and not human_turn and not move_undone):
-            if (not ai_thinking):
-                ai_thinking = True
-                return_queue = Queue()  # Used to pass data between threads
-                move_finder_process = Process(target=ChessAI.findBestMove, args=(game_state, valid_moves, return_queue))
-                move_finder_process.start()
-
-            if (move_finder_process and not move_finder_process.is_alive()):
-                try:
-                    ai_move = return_queue.get_nowait()
-                except:
-                    ai_move = ChessAI.findRandomMove(valid_moves)
-                
-                game_state.makeMove(ai_move)
-                move_made = True
-                animate = True
-                ai_thinking = False
-                move_finder_process = None  # Reset process after completion
-
+                        ai_response = None
+                        ponder_move = ponder_request_id = None
+
+        # The engine's reply wakes the loop with ENGINE_EVENT
+        expected_reply = None
+        # It is played once the human's move has finished animating, a ponder hit can answer instantly
+        if (ai_thinking and ai_response is None):
+            try:
+                ai_response = engine.pollResponse(ai_request_id)
+            except RuntimeError as error:
+
+                # Start a new engine for the rest of the game, this move is played at random
+                print(error)
+                engine.stop()  # Unregisters its exit hook and lets go of its queues
+                engine = ChessWorker.EngineWorker(USE_BITBOARDS, workers=AI_WORKERS,
+                                                  on_response=lambda: p.event.post(p.event.Event(ENGINE_EVENT)))
+                ai_response = {"move": None, "stats": {}}
+                ponder_move = ponder_request_id = None
+        if (ai_response is not None and not renderer.isAnimating()):
+            ai_move = None
+            if (ai_response["move"] is not None):
+                ai_move = valid_moves.findUCIMove(ai_response["move"])
+            if (ai_move is None):
+                ai_move = ChessAI.findRandomMove(valid_moves)
+
+            # The principal variation starts with the AI's move, the move after it is the expected reply
+            principal_variation = ai_response["stats"].get("pv", [])
+            if (len(principal_variation) > 1 and principal_variation[0] == ai_move.getUCINotation()):
+                expected_reply = principal_variation[1]
+
+            game_state.makeMove(ai_move)
+            move_made = True
+            animate = True
+            ai_thinking = False
+            ai_request_id = None
+            ai_response = None
+
+        # Moves are animated over the next frames while the loop keeps handling events
         if (move_made):
             if (animate):
-                animateMove(game_state.move_log[-1], screen, game_state.board, clock, not player_one)  # Pass flip_board
-            valid_moves = game_state.getValidMoves()
+                renderer.startAnimation(game_state)
+            else:
+                renderer.stopAnimation()
+            valid_moves = game_state.getValidMoves(indexed=True)
             move_made = False
             animate = False
-            move_undone = False
-
-        drawGameState(screen, game_state, valid_moves, square_selected, player_one)  # Pass player_one to control board flip
 
-        if (not game_over):
-            drawMoveLog(screen, game_state, move_log_font)
-        else:
-            # Draw PGN save button when the game is over
+        end_game_text = getEndGameText(game_state)
+        game_over = end_game_text is not None
+        if (game_over):
             pgn_string = generatePGN(game_state.move_log)
-            drawEndGameButton(screen, "Save PGN", BOARD_WIDTH + 20, BOARD_HEIGHT - 60, 200, 40, pgn_string)
 
-        if (game_state.checkmate):
-            game_over = True
-            if (game_state.white_to_move):
-                drawEndGameText(screen, "Black wins by checkmate")
+        # Start the AI as soon as it is its turn, its reply arrives as an event
+        human_turn = (game_state.white_to_move and player_one) or (not game_state.white_to_move and player_two)
+        if (not game_over and not human_turn and not ai_thinking):
+            ai_thinking = True
+            if (ponder_move is not None and game_state.move_log[-1].getUCINotation() == ponder_move):
+                ai_request_id = ponder_request_id  # Ponder hit, the search already running is the AI's answer
             else:
-                drawEndGameText(screen, "White wins by checkmate")
-        elif (game_state.stalemate):
-            game_over = True
-            drawEndGameText(screen, "Stalemate")
-
-        clock.tick(MAX_FPS)
-        p.display.flip()
+                if (ponder_request_id is not None):
+                    engine.cancel()  # Ponder miss, the engine keeps its transposition table for the real search
+                ai_request_id = engine.requestMove(game_state)  # Only the start FEN and the move list are sent
+            ponder_move = ponder_request_id = None
+
+        # Ponder: search the position after the expected reply while the human is thinking
+        elif (PONDER and expected_reply is not None and not game_over and human_turn and
+                valid_moves.findUCIMove(expected_reply) is not None):
+            ponder_move = expected_reply
+            ponder_request_id = engine.requestMove(game_state, ponder_move=ponder_move)
+
+        # Only squares and panels that changed since the last frame are drawn and updated on screen
+        if (renderer.isAnimating()):
+            renderer.drawAnimationFrame()
+        if (not renderer.isAnimating()):
+            renderer.drawBoard(game_state, valid_moves, square_selected, end_game_text)
+        renderer.drawPanel(game_state, game_over)
+        renderer.flush()
+
+# Text shown over the board once the game has ended, None while it goes on
+def getEndGameText(game_state):
+
+    if (game_state.checkmate):
+        return "Black wins by checkmate" if game_state.white_to_move else "White wins by checkmate"
+    elif (game_state.stalemate):
+        return "Stalemate"
+    elif (game_state.draw):
+        return "Draw by fifty-move rule" if game_state.isFiftyMoveDraw() else "Draw by repetition"
+    return None
+
+# Create a game state with the selected position backend
+def newGameState():
+
+    if (USE_BITBOARDS):
+        return ChessBitboard.BitboardGameState()
+    return ChessEngine.GameState()
 
 # Display the start screen where the user can choose to play as white or black
 def showStartScreen(screen, clock):
@@ -241,161 +309,255 @@ def loadImages():
     for piece in pieces:
         IMAGES[piece] = p.transform.scale(p.image.load(os.path.join(img_dir, piece + ".png")), (SQUARE_SIZE, SQUARE_SIZE))
 
-# Responsible for all the graphics within the current game state
-def drawGameState(screen, game_state, valid_moves, square_selected, player_one):
-
-    flip_board = not player_one  # Flip the board if player is black
-    drawBoard(screen, flip_board)  # Draw squares on the board
-    highlightSquares(screen, game_state, valid_moves, square_selected, player_one)
-    drawPieces(screen, game_state.board, flip_board)  # Draw pieces on top of those squares
-
-# Draw the squares on the board
-def drawBoard(screen, flip_board):
-
-    global colors
-    colors = [p.Color("white"), p.Color("gray")]
-
-    for row in range(DIMENSION):
-        for col in range(DIMENSION):
+# Retained-mode drawing of the game: remembers what is on every square and panel of the window,
+# redraws only what changed since the last frame and updates just those rectangles of the display
+class BoardRenderer:
+
+    def __init__(self, screen, flip_board, font):
+
+        self.screen = screen
+        self.flip_board = flip_board
+        self.move_log_view = MoveLogView(font)
+        self.dirty_rects = [screen.get_rect()]  # Parts of the window to update on the next flush
+        self.drawn_squares = {}  # (row, col) -> (piece, highlight) currently on screen
+        self.drawn_game_over = None  # Whether the panel currently shows the PGN save button
+        self.end_game_text = None
+        self.end_game_rect = p.Rect(0, 0, 0, 0)
+        self.animation_move = None  # Move being animated, None when there is no animation
+        self.animation_background = None
+        self.animation_start = 0
+        self.animation_duration = 0
+        self.animation_rect = None  # Where the moving piece was last drawn
+
+        # Empty board, drawn once and copied from for every square
+        colors = [p.Color("white"), p.Color("gray")]
+        self.background = p.Surface((BOARD_WIDTH, BOARD_HEIGHT))
+        for row in range(DIMENSION):
+            for col in range(DIMENSION):
+                p.draw.rect(self.background, colors[(row + col) % 2],
+                            p.Rect(col * SQUARE_SIZE, row * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE))
+
+        # Transparent squares for the last move, the selected piece and its moves
+        self.highlights = {}
+        for highlight, color in (("last move", "green"), ("selected", "blue"), ("move", "yellow")):
+            surface = p.Surface((SQUARE_SIZE, SQUARE_SIZE))
+            surface.set_alpha(100)
+            surface.fill(p.Color(color))
+            self.highlights[highlight] = surface
+
+    # Screen rectangle of a board square, flipped when the human plays black
+    def squareRect(self, row, col):
+
+        if (self.flip_board):
+            row = DIMENSION - 1 - row
+            col = DIMENSION - 1 - col
+        return p.Rect(col * SQUARE_SIZE, row * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE)
+
+    # Forget what is on screen so the next frame draws everything
+    def invalidate(self):
+        self.drawn_squares = {}
+        self.drawn_game_over = None
+
+    def drawSquare(self, row, col, piece, highlight):
+
+        rect = self.squareRect(row, col)
+        self.screen.blit(self.background, rect, rect)
+        if (highlight is not None):
+            self.screen.blit(self.highlights[highlight], rect)
+        if (piece != "--"):
+            self.screen.blit(IMAGES[piece], rect)
+        self.dirty_rects.append(rect)
+
+    # Draw every square whose piece or highlight changed, then the end game text if it was drawn over
+    # Not called during an animation, it would draw over the moving piece
+    def drawBoard(self, game_state, valid_moves, square_selected, end_game_text=None):
+
+        if (end_game_text != self.end_game_text):
+            self.drawn_squares = {}  # The old text has to be painted over
+            self.end_game_text = end_game_text
+            self.end_game_rect = p.Rect(0, 0, 0, 0)
+        highlights = getHighlights(game_state, valid_moves, square_selected)
+        board = game_state.board
+        text_covered = False
+        for row in range(DIMENSION):
+            for col in range(DIMENSION):
+                state = (board[row][col], highlights.get((row, col)))
+                if (self.drawn_squares.get((row, col)) != state):
+                    self.drawSquare(row, col, *state)
+                    self.drawn_squares[(row, col)] = state
+                    text_covered = text_covered or self.squareRect(row, col).colliderect(self.end_game_rect)
+        if (self.end_game_text is not None and (text_covered or not self.end_game_rect)):
+            self.end_game_rect = drawEndGameText(self.screen, self.end_game_text)
+            self.dirty_rects.append(self.end_game_rect)
+
+    # Draw the move log, and the PGN save button below it once the game is over, when either changed
+    def drawPanel(self, game_state, game_over):
+
+        if (not self.move_log_view.update(game_state.move_log) and game_over == self.drawn_game_over):
+            return
+        self.drawn_game_over = game_over
+        panel_rect = p.Rect(BOARD_WIDTH, 0, MOVE_LOG_PANEL_WIDTH, MOVE_LOG_PANEL_HEIGHT)
+        p.draw.rect(self.screen, p.Color("black"), panel_rect)
+        if (game_over):
+            self.move_log_view.draw(self.screen, p.Rect(BOARD_WIDTH, 0, MOVE_LOG_PANEL_WIDTH,
+                                                        END_GAME_BUTTON_Y - MOVE_LOG_PADDING))
+            drawEndGameButton(self.screen, "Save PGN", END_GAME_BUTTON_X, END_GAME_BUTTON_Y,
+                              END_GAME_BUTTON_WIDTH, END_GAME_BUTTON_HEIGHT)
+        else:
+            self.move_log_view.draw(self.screen, panel_rect)
+        self.dirty_rects.append(panel_rect)
+
+    # Update only the changed parts of the window
+    def flush(self):
+
+        if (self.dirty_rects):
+            p.display.update(self.dirty_rects)
+            self.dirty_rects = []
+
+    def isAnimating(self):
+        return self.animation_move is not None
+
+    # Start sliding the piece of the last move from its start to its end square, drawAnimationFrame moves it on
+    # Frames only restore the square the piece left and draw it at its new place
+    def startAnimation(self, game_state):
+
+        self.stopAnimation()
+        move = game_state.move_log[-1]
+        self.drawBoard(game_state, ChessEngine.MoveSet(), ())
+        self.drawSquare(move.end_row, move.end_col, move.piece_captured, None)  # Captured piece stays until the end
+        self.drawn_squares.pop((move.end_row, move.end_col))
+        self.animation_move = move
+        self.animation_background = self.screen.copy()
+        self.animation_start = p.time.get_ticks()
+        squares = abs(move.end_row - move.start_row) + abs(move.end_col - move.start_col)
+        self.animation_duration = squares * ANIMATION_FRAMES_PER_SQUARE * 1000 // ANIMATION_FPS
+        self.animation_rect = None
+
+    # Draw the moving piece where it is by now, the animation ends once it reaches its square
+    def drawAnimationFrame(self):
+
+        move = self.animation_move
+        progress = min(1, (p.time.get_ticks() - self.animation_start) / self.animation_duration)
+        start_rect = self.squareRect(move.start_row, move.start_col)
+        end_rect = self.squareRect(move.end_row, move.end_col)
 
-            # If flip_board is True, reverse the row and column indices to flip the board
-            actual_row = row if not flip_board else DIMENSION - 1 - row
-            actual_col = col if not flip_board else DIMENSION - 1 - col
+        # Linear interpolation
+        piece_rect = p.Rect(start_rect.x + (end_rect.x - start_rect.x) * progress,
+                            start_rect.y + (end_rect.y - start_rect.y) * progress, SQUARE_SIZE, SQUARE_SIZE)
+        if (self.animation_rect is not None):
+            self.screen.blit(self.animation_background, self.animation_rect, self.animation_rect)
+            self.dirty_rects.append(self.animation_rect)
+        if (progress < 1):
+            self.screen.blit(IMAGES[move.piece_moved], piece_rect)
+            self.dirty_rects.append(piece_rect)
+            self.animation_rect = piece_rect
+        else:
+            self.stopAnimation()  # drawBoard puts the piece on its square
 
-            color = colors[((actual_row + actual_col) % 2)]
-            p.draw.rect(screen, color, p.Rect(actual_col * SQUARE_SIZE, actual_row * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE))
+    # Drop the animation, the squares it drew over are redrawn by the next drawBoard
+    def stopAnimation(self):
 
-# Highlight the selected square and all valid moves for the selected piece
-def highlightSquares(screen, game_state, valid_moves, square_selected, player_one):
+        if (self.animation_move is None):
+            return
+        if (self.animation_rect is not None):
+            self.screen.blit(self.animation_background, self.animation_rect, self.animation_rect)
+            self.dirty_rects.append(self.animation_rect)
+        self.animation_move = None
+        self.animation_background = None
+        self.animation_rect = None
 
-    flip_board = not player_one  # Flip the board if player is black
+# Highlight of each highlighted square: the last move's end square, the selected piece and where it can move
+def getHighlights(game_state, valid_moves, square_selected):
 
+    highlights = {}
     if (len(game_state.move_log) > 0):
         last_move = game_state.move_log[-1]
-        s = p.Surface((SQUARE_SIZE, SQUARE_SIZE))
-        s.set_alpha(100)
-        s.fill(p.Color('green'))
-
-        # Flip last move coordinates if needed
-        end_row = last_move.end_row if not flip_board else DIMENSION - 1 - last_move.end_row
-        end_col = last_move.end_col if not flip_board else DIMENSION - 1 - last_move.end_col
-        screen.blit(s, (end_col * SQUARE_SIZE, end_row * SQUARE_SIZE))
+        highlights[(last_move.end_row, last_move.end_col)] = "last move"
 
+    # Ensure the selected piece matches the current turn color
     if (square_selected != ()):
         row, col = square_selected
-
-        # Flip selected square coordinates if needed
-        selected_row = row if not flip_board else DIMENSION - 1 - row
-        selected_col = col if not flip_board else DIMENSION - 1 - col
-
-        # Ensure the selected piece matches the current turn color
         if (game_state.board[row][col][0] == ('w' if game_state.white_to_move else 'b')):
-            s = p.Surface((SQUARE_SIZE, SQUARE_SIZE))
-            s.set_alpha(100)
-            s.fill(p.Color('blue'))
-            screen.blit(s, (selected_col * SQUARE_SIZE, selected_row * SQUARE_SIZE))
-
-            # Highlight all possible moves for this piece
-            s.fill(p.Color('yellow'))
-            for move in valid_moves:
-
-                # Check if move's start matches selected piece's position
-                start_row = move.start_row
-                start_col = move.start_col
+            highlights[(row, col)] = "selected"
+            for move in valid_moves.movesFrom((row, col)):
+                highlights[(move.end_row, move.end_col)] = "move"
+    return highlights
+
+# Move log panel that keeps every line it rendered, so a new move only renders the line it goes on
+# and drawing blits just the lines that fit in the panel, however long the game is
+class MoveLogView:
+
+    def __init__(self, font):
+
+        self.font = font
+        self.moves = []  # Moves the cached lines were rendered from
+        self.lines = []  # Rendered surface of each line
+        self.line_height = font.get_linesize() + MOVE_LOG_LINE_SPACING
+        self.visible_lines = 1  # Lines that fitted in the panel when it was last drawn
+        self.scroll_line = None  # First line shown, None keeps the end of the log in view
+        self.changed = True
+
+    # Bring the cached lines up to date with the move log, returns True if the panel has to be redrawn
+    def update(self, move_log):
+
+        # The log only grows or shrinks at its end, and a reset starts a new list, so the moves still
+        # rendered are found by walking back from the end until they are the same objects
+        kept = min(len(self.moves), len(move_log))
+        while (kept > 0 and self.moves[kept - 1] is not move_log[kept - 1]):
+            kept -= 1
+        if (kept == len(self.moves) and kept == len(move_log)):
+            return self.changed
+
+        # Re-render from the line of the first changed move, normally just the last line
+        plies_per_line = 2 * MOVE_LOG_MOVES_PER_LINE
+        first_line = kept // plies_per_line
+        del self.moves[kept:]
+        self.moves.extend(move_log[kept:])
+        del self.lines[first_line:]
+        for line in range(first_line, (len(self.moves) + plies_per_line - 1) // plies_per_line):
+            self.lines.append(self.renderLine(line))
+        self.changed = True
+        return True
+
+    # Render one line: "1. e4 e5  2. Nf3 Nc6  3. Bb5 a6  "
+    def renderLine(self, line):
 
-                # Check for valid moves only for the piece selected
-                if (start_row == row and start_col == col):
-
-                    # Flip end position of the move if necessary
-                    end_row = move.end_row if not flip_board else DIMENSION - 1 - move.end_row
-                    end_col = move.end_col if not flip_board else DIMENSION - 1 - move.end_col
-                    screen.blit(s, (end_col * SQUARE_SIZE, end_row * SQUARE_SIZE))
-
-# Draw the pieces on the board
-def drawPieces(screen, board, flip_board):
-
-    for row in range(DIMENSION):
-        for col in range(DIMENSION):
-
-            # Flip coordinates if needed
-            actual_row = row if not flip_board else DIMENSION - 1 - row
-            actual_col = col if not flip_board else DIMENSION - 1 - col
-            piece = board[row][col]
-            if (piece != "--"):
-                screen.blit(IMAGES[piece], p.Rect(actual_col * SQUARE_SIZE, actual_row * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE))
-
-# Animate the move
-def animateMove(move, screen, board, clock, flip_board):
-
-    delta_r = move.end_row - move.start_row
-    delta_c = move.end_col - move.start_col
-    frames_per_square = 10 
-    frame_count = (abs(delta_r) + abs(delta_c)) * frames_per_square
-
-    piece_img = IMAGES[move.piece_moved]
-    
-    # Calculate start and end coordinates
-    start_row = move.start_row if not flip_board else DIMENSION - 1 - move.start_row
-    start_col = move.start_col if not flip_board else DIMENSION - 1 - move.start_col
-    end_row = move.end_row if not flip_board else DIMENSION - 1 - move.end_row
-    end_col = move.end_col if not flip_board else DIMENSION - 1 - move.end_col
-
-    start_x, start_y = start_col * SQUARE_SIZE, start_row * SQUARE_SIZE
-    end_x, end_y = end_col * SQUARE_SIZE, end_row * SQUARE_SIZE
-
-    for frame in range(frame_count + 1):
-
-        # Linear interpolation
-        current_x = start_x + (end_x - start_x) * frame / frame_count
-        current_y = start_y + (end_y - start_y) * frame / frame_count
-
-        # Draw board and pieces except the moving piece
-        drawBoard(screen, flip_board)
-        drawPieces(screen, board, flip_board)
-
-        # "Erase" the piece from the ending square (to handle captures)
-        color = colors[(end_row + end_col) % 2]
-        end_square = p.Rect(end_x, end_y, SQUARE_SIZE, SQUARE_SIZE)
-        p.draw.rect(screen, color, end_square)
-        
-        # Draw captured piece if there is one
-        if (move.piece_captured != '--'):
-            screen.blit(IMAGES[move.piece_captured], end_square)
-
-        # Draw the moving piece at its current animated position
-        screen.blit(piece_img, p.Rect(current_x, current_y, SQUARE_SIZE, SQUARE_SIZE))
-
-        p.display.flip()
-        clock.tick(60)  # Higher FPS for smoother animation
-
-# Draw the move log
-def drawMoveLog(screen, game_state, font):
-
-    move_log_rect = p.Rect(BOARD_WIDTH, 0, MOVE_LOG_PANEL_WIDTH, MOVE_LOG_PANEL_HEIGHT)
-    p.draw.rect(screen, p.Color("black"), move_log_rect)
-    move_log = game_state.move_log
-    move_texts = []
-    for i in range(0, len(move_log), 2):
-        move_string = str(i // 2 + 1) + ". " + str(move_log[i]) + " "
-        if (i + 1 < len(move_log)):  # Make sure black made a move
-            move_string += str(move_log[i + 1])
-        move_texts.append(move_string)
-
-    moves_per_row = 3
-    padding = 5
-    text_y = padding
-    line_spacing = 2
-    for i in range(0, len(move_texts), moves_per_row):
         text = ""
-        for j in range(moves_per_row):
-            if (i + j < len(move_texts)):
-                text += move_texts[i + j] + "  "
-        text_object = font.render(text, True, p.Color('white'))
-        text_location = move_log_rect.move(padding, text_y)
-        screen.blit(text_object, text_location)
-        text_y += text_object.get_height() + line_spacing
-
-# Draw the end game text
+        start = line * 2 * MOVE_LOG_MOVES_PER_LINE
+        for ply in range(start, min(start + 2 * MOVE_LOG_MOVES_PER_LINE, len(self.moves)), 2):
+            text += str(ply // 2 + 1) + ". " + str(self.moves[ply]) + " "
+            if (ply + 1 < len(self.moves)):  # Make sure black made a move
+                text += str(self.moves[ply + 1])
+            text += "  "
+        return self.font.render(text, True, p.Color('white'))
+
+    # First line shown when the log is scrolled to its end
+    def lastFirstLine(self):
+        return max(0, len(self.lines) - self.visible_lines)
+
+    # Scroll by a number of lines, negative scrolls back towards the start of the game
+    def scroll(self, lines):
+
+        last_first_line = self.lastFirstLine()
+        first_line = last_first_line if self.scroll_line is None else self.scroll_line
+        first_line = min(max(first_line + lines, 0), last_first_line)
+        self.scroll_line = None if first_line == last_first_line else first_line
+        self.changed = True
+
+    # Draw the lines that fit in the rectangle onto the panel background
+    def draw(self, screen, rect):
+
+        self.visible_lines = max(1, (rect.height - MOVE_LOG_PADDING) // self.line_height)
+        first_line = self.lastFirstLine()
+        if (self.scroll_line is not None):
+            first_line = min(self.scroll_line, first_line)
+        text_y = rect.y + MOVE_LOG_PADDING
+        for line in self.lines[first_line:first_line + self.visible_lines]:
+            screen.blit(line, (rect.x + MOVE_LOG_PADDING, text_y))
+            text_y += self.line_height
+        self.changed = False
+
+# Draw the end game text, returns the rectangle it covers
 def drawEndGameText(screen, text):
 
     font = p.font.SysFont("Helvitca", 32, True, False)
@@ -405,6 +567,7 @@ def drawEndGameText(screen, text):
     screen.blit(text_object, text_location)
     text_object = font.render(text, 0, p.Color('Black'))
     screen.blit(text_object, text_location.move(2, 2))
+    return p.Rect(text_location.x, text_location.y, text_object.get_width() + 2, text_object.get_height() + 2)
 
 # Generate a PGN string from the move log
 def generatePGN(move_log):
@@ -417,8 +580,8 @@ def generatePGN(move_log):
         pgn.append(move_number)
     return " ".join(pgn)
 
-# Create a button to save the PGN
-def drawEndGameButton(screen, text, x, y, width, height, pgn_string):
+# Create a button to save the PGN, clicks on it are handled in main
+def drawEndGameButton(screen, text, x, y, width, height):
 
     font = p.font.SysFont("Arial", 24)
     button_color = (180, 180, 180)
@@ -426,12 +589,6 @@ def drawEndGameButton(screen, text, x, y, width, height, pgn_string):
     text_surf = font.render(text, True, (0, 0, 0))
     screen.blit(text_surf, (x + width // 2 - text_surf.get_width() // 2, y + height // 2 - text_surf.get_height() // 2))
 
-    # Check if button is clicked and save PGN
-    if p.mouse.get_pressed()[0]:
-        mouse_x, mouse_y = p.mouse.get_pos()
-        if x <= mouse_x <= x + width and y <= mouse_y <= y + height:
-            savePGNToFile(pgn_string) 
-
 # Save the PGN to a file
 def savePGNToFile(pgn_string):
 
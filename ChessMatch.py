@@ -0,0 +1,216 @@
+"""
+Moksh S. GHP Project 2024
+ChessMatch.py
+Self-play match between two engine configurations
+Plays games in a pool of processes from random openings, each opening once with each colour,
+adjudicates long or dead games and prints the score, an Elo difference estimate, nodes per second and time per move
+"""
+
+# Importing the required libraries
+import argparse
+import math
+import multiprocessing
+import random
+import sys
+import time
+import ChessEngine, ChessAI, ChessBitboard, ChessScores, ChessWorker
+
+# Engine options and their defaults, set on the command line as key=value pairs
+DEFAULT_CONFIG = {"depth": ChessAI.MAX_DEPTH,
+                  "movetime": 200,  # Milliseconds per move
+                  "position_weight": 1.0,  # Weight of the piece position scores, 0 is material only
+                  "delta_margin": ChessAI.DELTA_MARGIN,
+                  "tt_mb": ChessAI.TT_SIZE_MB}
+OPENING_PLIES = 4  # Random moves played from the start position before the engines take over
+MAX_PLIES = 300  # Games still going after this many plies are drawn
+DRAW_SCORE = 0.2  # Both engines scoring within this many pawns of 0 ...
+WIN_SCORE = 10  # ... or both agreeing one side is this many pawns up ...
+ADJUDICATION_PLIES = 10  # ... for this many plies in a row ends the game
+ADJUDICATION_START_PLY = 60  # Draws are only adjudicated after this ply
+
+
+# Parse "depth=4,movetime=500" into an engine configuration
+def parseConfig(text):
+
+    config = dict(DEFAULT_CONFIG)
+    for option in filter(None, text.split(",")):
+        key, _, value = option.partition("=")
+        if (key not in config):
+            raise argparse.ArgumentTypeError("unknown engine option " + key + ", expected one of " + ", ".join(config))
+        config[key] = type(DEFAULT_CONFIG[key])(value)
+    return config
+
+# Set the module globals the search reads, returns True if the evaluation tables changed
+def applyConfig(config, engine_state):
+
+    ChessAI.DELTA_MARGIN = config["delta_margin"]
+    ChessAI.transposition_table = engine_state["transposition_table"]
+    if (ChessEngine.PIECE_SQUARE_SCORES == engine_state["piece_square_scores"]):
+        return False
+    ChessEngine.setPieceSquareScores(engine_state["piece_square_scores"])
+    return True
+
+# Random opening moves from the start position, the same seed always gives the same opening
+def randomOpening(seed, plies):
+
+    rng = random.Random(seed)
+    game_state = ChessBitboard.BitboardGameState()
+    moves = []
+    for _ in range(plies):
+        valid_moves = game_state.getValidMoves()
+        if (len(valid_moves) == 0):
+            break
+        move = rng.choice(valid_moves)
+        game_state.makeMove(move)
+        moves.append(move.getUCINotation())
+    return moves
+
+# Neither side can mate: bare kings, or a king and one minor piece against a bare king
+def insufficientMaterial(game_state):
+
+    pieces = [piece[1] for row in game_state.board for piece in row if piece != "--" and piece[1] != "K"]
+    return len(pieces) == 0 or (len(pieces) == 1 and pieces[0] in "BN")
+
+# Rebuild the game from its moves, the incremental evaluation has to be redone when the tables change
+def replayGame(moves):
+
+    game_state = ChessBitboard.BitboardGameState()
+    for notation in moves:
+        game_state.makeMove(ChessWorker.findMoveByNotation(game_state, notation))
+    return game_state
+
+# Play one game in a pool process, engine 0 plays white when engine_one_white is set
+# Returns the result from engine 0's point of view (1, 0.5 or 0) and per-engine search statistics
+def playGame(arguments):
+
+    game_number, configs, opening_seed, engine_one_white = arguments
+    engine_states = [{"transposition_table": ChessAI.TranspositionTable(config["tt_mb"]),
+                      "piece_square_scores": ChessScores.buildPieceSquareScores(config["position_weight"])}
+                     for config in configs]
+    statistics = [{"moves": 0, "nodes": 0, "time": 0.0, "depth": 0} for _ in configs]
+    moves = randomOpening(opening_seed, OPENING_PLIES)
+    game_state = replayGame(moves)
+    draw_plies = 0
+    win_plies = 0
+    last_score = 0
+    result = None
+    reason = None
+
+    while (result is None):
+        valid_moves = game_state.getValidMoves()
+        engine = 0 if game_state.white_to_move == engine_one_white else 1
+        if (game_state.checkmate):
+            result, reason = (0 if engine == 0 else 1), "checkmate"
+            break
+        if (game_state.stalemate):
+            result, reason = 0.5, "stalemate"
+            break
+        if (game_state.draw):
+            result, reason = 0.5, "fifty-move rule" if game_state.isFiftyMoveDraw() else "repetition"
+            break
+        if (insufficientMaterial(game_state)):
+            result, reason = 0.5, "insufficient material"
+            break
+        if (len(moves) >= MAX_PLIES):
+            result, reason = 0.5, "move limit"
+            break
+
+        config = configs[engine]
+        if (applyConfig(config, engine_states[engine])):
+            game_state = replayGame(moves)
+            valid_moves = game_state.getValidMoves()
+        start_time = time.perf_counter()
+        iterations = ChessAI.iterativeDeepening(game_state, valid_moves, config["movetime"], config["depth"])
+        statistics[engine]["time"] += time.perf_counter() - start_time
+        statistics[engine]["nodes"] += ChessAI.nodes + ChessAI.qsearch_nodes
+        statistics[engine]["moves"] += 1
+        depth, move, score = iterations[-1]
+        statistics[engine]["depth"] += depth
+
+        # Adjudicate on the scores of both engines' last searches, each from the side to move's point of view
+        if (abs(score) <= DRAW_SCORE and abs(last_score) <= DRAW_SCORE and len(moves) >= ADJUDICATION_START_PLY):
+            draw_plies += 1
+        else:
+            draw_plies = 0
+        if (score >= WIN_SCORE and last_score <= -WIN_SCORE):
+            win_plies += 1
+        else:
+            win_plies = 0
+        last_score = score
+        if (draw_plies >= ADJUDICATION_PLIES):
+            result, reason = 0.5, "adjudicated draw"
+            break
+        if (win_plies >= ADJUDICATION_PLIES):
+            result, reason = (1 if engine == 0 else 0), "adjudicated win"
+            break
+
+        game_state.makeMove(move)
+        moves.append(move.getUCINotation())
+
+    return {"game": game_number, "engine_one_white": engine_one_white, "result": result, "reason": reason,
+            "plies": len(moves), "moves": moves, "statistics": statistics}
+
+# Elo difference and its 95% error margin from a list of game results, None when one side won everything
+def eloDifference(results):
+
+    games = len(results)
+    score = sum(results) / games
+    if (score <= 0 or score >= 1):
+        return None, None
+    elo = -400 * math.log10(1 / score - 1)
+    deviation = math.sqrt(sum((result - score) ** 2 for result in results) / games / games)
+    low = min(max(score - 1.96 * deviation, 1e-9), 1 - 1e-9)
+    high = min(max(score + 1.96 * deviation, 1e-9), 1 - 1e-9)
+    margin = (-400 * math.log10(1 / high - 1) + 400 * math.log10(1 / low - 1)) / 2
+    return elo, margin
+
+# Print the match summary from the finished games
+def printSummary(configs, games, output=sys.stdout):
+
+    results = [game["result"] for game in games]
+    wins = results.count(1)
+    draws = results.count(0.5)
+    losses = results.count(0)
+    print(f"Engine 1 vs engine 2: +{wins} ={draws} -{losses}  score {sum(results)}/{len(results)}", file=output)
+    elo, margin = eloDifference(results)
+    if (elo is None):
+        print("Elo difference: not measurable from a one-sided result", file=output)
+    else:
+        print(f"Elo difference: {elo:+.0f} +/- {margin:.0f}", file=output)
+    for engine, config in enumerate(configs):
+        moves = sum(game["statistics"][engine]["moves"] for game in games)
+        nodes = sum(game["statistics"][engine]["nodes"] for game in games)
+        seconds = sum(game["statistics"][engine]["time"] for game in games)
+        depth = sum(game["statistics"][engine]["depth"] for game in games)
+        options = ",".join(key + "=" + str(value) for key, value in config.items())
+        print(f"Engine {engine + 1} ({options}): {nodes / seconds if seconds > 0 else 0:.0f} nps, "
+              f"{seconds / moves * 1000 if moves else 0:.0f} ms/move, average depth {depth / moves if moves else 0:.1f}",
+              file=output)
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description="Play games between two engine configurations")
+    parser.add_argument("--engine1", type=parseConfig, default=parseConfig(""),
+                        help="options as key=value pairs separated by commas, keys: " + ", ".join(DEFAULT_CONFIG))
+    parser.add_argument("--engine2", type=parseConfig, default=parseConfig(""), help="options of the second engine")
+    parser.add_argument("--games", type=int, default=20, help="number of games, each opening is played with both colours")
+    parser.add_argument("--workers", type=int, default=ChessAI.PARALLEL_WORKERS, help="games played at once")
+    parser.add_argument("--seed", type=int, default=2024, help="seed for the random openings")
+    parser.add_argument("--verbose", action="store_true", help="print every game as it finishes")
+    args = parser.parse_args(argv)
+
+    configs = [args.engine1, args.engine2]
+    game_arguments = [(game, configs, args.seed + game // 2, game % 2 == 0) for game in range(args.games)]
+    games = []
+    with multiprocessing.Pool(max(1, args.workers)) as pool:
+        for game in pool.imap_unordered(playGame, game_arguments):
+            games.append(game)
+            if (args.verbose):
+                print(f"Game {game['game'] + 1}: engine 1 {'white' if game['engine_one_white'] else 'black'}, "
+                      f"{game['result']} ({game['reason']}, {game['plies']} plies) {' '.join(game['moves'])}", flush=True)
+    games.sort(key=lambda game: game["game"])
+    printSummary(configs, games)
+    return 0
+
+if (__name__ == "__main__"):
+    sys.exit(main())
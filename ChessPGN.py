@@ -0,0 +1,95 @@
+"""
+Moksh S. GHP Project 2024
+ChessPGN.py
+Reading PGN games one at a time and turning their SAN moves into engine moves
+"""
+
+# Importing the required libraries
+import re
+
+RESULTS = ("1-0", "0-1", "1/2-1/2", "*")
+MOVE_NUMBER = re.compile(r"^\d+\.+")
+SAN_SUFFIXES = "+#!?"
+
+
+# Read PGN games from an iterable of lines, yields (tags, SAN moves) one game at a time
+def readGames(lines):
+
+    tags = {}
+    moves = []
+    comment_depth = 0  # Inside {...}
+    variation_depth = 0  # Inside (...)
+    for line in lines:
+        line = line.strip()
+        if (comment_depth == 0 and variation_depth == 0 and line.startswith("[")):
+
+            # A tag after some moves starts the next game
+            if (moves):
+                yield tags, moves
+                tags = {}
+                moves = []
+            match = re.match(r'\[(\w+)\s+"(.*)"\]', line)
+            if (match):
+                tags[match.group(1)] = match.group(2)
+            continue
+        if (line.startswith("%")):
+            continue  # Escaped line
+
+        for token in re.findall(r"\{|\}|\(|\)|;.*|[^\s{}()]+", line):
+            if (comment_depth):
+                if (token == "}"):
+                    comment_depth = 0
+            elif (token == "{"):
+                comment_depth = 1
+            elif (token.startswith(";")):
+                continue  # Rest of the line is a comment
+            elif (token == "("):
+                variation_depth += 1
+            elif (token == ")"):
+                variation_depth = max(0, variation_depth - 1)
+            elif (variation_depth == 0):
+                token = MOVE_NUMBER.sub("", token)
+
+                # The result ends the game, so games without tags do not run into each other
+                if (token in RESULTS):
+                    yield tags, moves
+                    tags = {}
+                    moves = []
+                elif (token and not token.startswith("$")):
+                    moves.append(token)
+    if (moves or tags):
+        yield tags, moves
+
+# Find the legal move for a SAN move such as e4, Nbd7, exd5, e8=Q, O-O
+# Also reads the notation this engine writes itself (0-0, e8Q, no disambiguation), taking the first match if ambiguous
+def parseSAN(game_state, san):
+
+    notation = san.rstrip(SAN_SUFFIXES).replace("=", "")
+    valid_moves = game_state.getValidMoves()
+    if (notation in ("O-O", "0-0", "O-O-O", "0-0-0")):
+        for move in valid_moves:
+            if (move.is_castle_move and (move.end_col == 6) == (len(notation) == 3)):
+                return move
+        raise ValueError("Illegal castle " + san + " in position " + game_state.getFEN())
+
+    # Promotion piece (the engine always promotes to a queen)
+    if (len(notation) > 2 and notation[-1] in "QRBN" and notation[-2] in "18"):
+        notation = notation[:-1]
+    piece = notation[0] if notation[0] in "KQRBN" else "p"
+    if (piece != "p"):
+        notation = notation[1:]
+    notation = notation.replace("x", "")
+    if (len(notation) < 2 or notation[-2] not in "abcdefgh" or notation[-1] not in "12345678"):
+        raise ValueError("Cannot read move " + san)
+    end_col = "abcdefgh".index(notation[-2])
+    end_row = 8 - int(notation[-1])
+    disambiguation = notation[:-2]
+
+    for move in valid_moves:
+        if (move.piece_moved[1] != piece or move.end_row != end_row or move.end_col != end_col):
+            continue
+        if (any((char in "abcdefgh" and "abcdefgh".index(char) != move.start_col) or
+                (char in "12345678" and 8 - int(char) != move.start_row) for char in disambiguation)):
+            continue
+        return move
+    raise ValueError("Illegal move " + san + " in position " + game_state.getFEN())
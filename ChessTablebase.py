@@ -0,0 +1,287 @@
+"""
+Moksh S. GHP Project 2024
+ChessTablebase.py
+Endgame tablebases for a king and a few pieces against a bare king (KQK, KRK, KPK, KBNK)
+Tables are built by retrograde analysis: start from every checkmate and walk moves backwards, one ply at a time,
+so every position gets its exact result and distance to mate. Run it to build the tables: python ChessTablebase.py
+"""
+
+# Importing the required libraries
+import argparse
+import itertools
+import os
+import sys
+import time
+import zlib
+import ChessBitboard
+
+TABLEBASE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tablebases")
+TABLEBASES = ("KQK", "KRK", "KPK", "KBNK")  # KPK needs KQK for its promotions, so KQK comes first
+TABLEBASE_MAGIC = b"MMTB01"
+PIECE_ORDER = "QRBNP"  # Order of the strong side's pieces in a table name and position index
+ILLEGAL = 255  # Stored value of an impossible position, otherwise 0 is a draw and n is a win in n - 1 plies
+MAX_PIECES = 4
+
+# Tables loaded so far, None for a table that has no file
+tables = {}
+
+
+# Table name of a king and the given pieces against a bare king, for example KBNK
+def tableName(pieces):
+    return "K" + "".join(sorted(pieces, key=PIECE_ORDER.index)) + "K"
+
+# Index of a position in a table: the squares of the strong king, the bare king and the pieces, then the side to move
+def positionIndex(squares, strong_to_move):
+
+    index = 0
+    for square in squares:
+        index = index * 64 + square
+    return index * 2 + (0 if strong_to_move else 1)
+
+# Squares of a position from its index
+def positionSquares(index, piece_count):
+
+    index >>= 1
+    squares = []
+    for _ in range(piece_count):
+        index, square = divmod(index, 64)
+        squares.append(square)
+    return squares[::-1]
+
+# Squares attacked by one of the strong side's pieces, pawns move up the board (towards row 0)
+def pieceAttacks(piece, square, occupancy):
+
+    if (piece == "Q"):
+        return ChessBitboard.rookAttacks(square, occupancy) | ChessBitboard.bishopAttacks(square, occupancy)
+    if (piece == "R"):
+        return ChessBitboard.rookAttacks(square, occupancy)
+    if (piece == "B"):
+        return ChessBitboard.bishopAttacks(square, occupancy)
+    if (piece == "N"):
+        return ChessBitboard.KNIGHT_ATTACKS[square]
+    if (piece == "P"):
+        return ChessBitboard.PAWN_ATTACKS["w"][square]
+    return ChessBitboard.KING_ATTACKS[square]
+
+# Squares attacked by the strong side, looking through the bare king so it cannot step back along a line
+def strongAttacks(squares, pieces, occupancy, skip=None):
+
+    attacks = ChessBitboard.KING_ATTACKS[squares[0]]
+    for i, piece in enumerate(pieces):
+        if (i != skip):
+            attacks |= pieceAttacks(piece, squares[i + 2], occupancy)
+    return attacks
+
+# Squares the strong side's piece i could have come from with a quiet move (nothing is ever captured by it)
+def unmoveSquares(piece, square, occupancy):
+
+    if (piece == "P"):
+        origins = []
+        if (square + 8 < 56 and not occupancy & (1 << (square + 8))):
+            origins.append(square + 8)
+            if (square // 8 == 4 and not occupancy & (1 << (square + 16))):
+                origins.append(square + 16)
+        return origins
+    targets = pieceAttacks(piece, square, occupancy) & ~occupancy
+    origins = []
+    while (targets):
+        target_bit = targets & -targets
+        targets ^= target_bit
+        origins.append(target_bit.bit_length() - 1)
+    return origins
+
+# Build one table, dependencies holds the tables its promotions lead into
+def generateTable(name, dependencies):
+
+    pieces = name[1:-1]
+    piece_count = len(pieces) + 2
+    values = bytearray(2 * 64 ** piece_count)
+    counts = bytearray(len(values))  # Legal moves of a bare-king position not yet known to lose
+    frontier = []  # Positions decided at the current distance to mate, starting with the checkmates
+    promotion_wins = {}  # Distance to mate -> strong-to-move positions that win by promoting
+
+    for squares in itertools.product(range(64), repeat=piece_count):
+        index = positionIndex(squares, True)
+        strong_king, bare_king = squares[0], squares[1]
+        occupancy = 0
+        for square in squares:
+            occupancy |= 1 << square
+        if (bin(occupancy).count("1") != piece_count or ChessBitboard.KING_ATTACKS[strong_king] & (1 << bare_king) or
+                any(piece == "P" and not 8 <= squares[i + 2] < 56 for i, piece in enumerate(pieces))):
+            values[index] = values[index + 1] = ILLEGAL
+            continue
+        sliding_occupancy = occupancy & ~(1 << bare_king)
+        attacked = strongAttacks(squares, pieces, sliding_occupancy)
+
+        # Strong side to move with the bare king in check cannot happen
+        if (attacked & (1 << bare_king)):
+            values[index] = ILLEGAL
+        else:
+
+            # Promotions leave the table, their result comes from the queen's table
+            for i, piece in enumerate(pieces):
+                promotion_square = squares[i + 2] - 8
+                if (piece == "P" and promotion_square < 8 and not occupancy & (1 << promotion_square)):
+                    promoted = sorted([("Q", promotion_square) if j == i else (pieces[j], squares[j + 2])
+                                       for j in range(len(pieces))], key=lambda pair: PIECE_ORDER.index(pair[0]))
+                    promoted_name = tableName(piece for piece, square in promoted)
+                    promoted_squares = list(squares[:2]) + [square for piece, square in promoted]
+                    value = dependencies[promoted_name][positionIndex(promoted_squares, False)]
+                    if (0 < value < ILLEGAL):
+                        promotion_wins.setdefault(value, []).append(index)
+
+        # Bare king's moves, a safe capture always draws since no mate is left
+        moves = bin(ChessBitboard.KING_ATTACKS[bare_king] & ~occupancy & ~attacked).count("1")
+        escapes = False
+        if (ChessBitboard.KING_ATTACKS[bare_king] & sliding_occupancy):
+            for i in range(len(pieces)):
+                target = squares[i + 2]
+                if (ChessBitboard.KING_ATTACKS[bare_king] & (1 << target) and
+                        not strongAttacks(squares, pieces, sliding_occupancy, skip=i) & (1 << target)):
+                    escapes = True
+        if (escapes):
+            counts[index + 1] = ILLEGAL  # Never counts down to zero
+        elif (moves == 0 and attacked & (1 << bare_king)):
+            values[index + 1] = 1  # Checkmate
+            frontier.append(index + 1)
+        else:
+            counts[index + 1] = moves
+
+    # Walk back one ply at a time: a strong-side position wins as soon as one move reaches a lost position,
+    # a bare-king position is lost once every move reaches a won one
+    # Moving the piece at a position in the square list from one square to another changes the index by a fixed step
+    steps = [2 * 64 ** (piece_count - 1 - position) for position in range(piece_count)]
+    distance = 0
+    while (frontier or promotion_wins):
+        next_frontier = []
+        for index in frontier:
+            squares = positionSquares(index, piece_count)
+            occupancy = 0
+            for square in squares:
+                occupancy |= 1 << square
+            if (index & 1):
+                for i, piece in enumerate("K" + pieces):
+                    position = 0 if i == 0 else i + 1
+                    square = squares[position]
+                    for origin in unmoveSquares(piece, square, occupancy):
+                        parent = index - 1 + (origin - square) * steps[position]
+                        if (values[parent] == 0):
+                            values[parent] = distance + 2
+                            next_frontier.append(parent)
+            else:
+                for origin in unmoveSquares("K", squares[1], occupancy):
+                    parent = index + 1 + (origin - squares[1]) * steps[1]
+                    if (values[parent] == 0 and counts[parent] != ILLEGAL):
+                        counts[parent] -= 1
+                        if (counts[parent] == 0):
+                            values[parent] = distance + 2
+                            next_frontier.append(parent)
+        distance += 1
+        for index in promotion_wins.pop(distance, []):
+            if (values[index] == 0):
+                values[index] = distance + 1
+                next_frontier.append(index)
+        frontier = next_frontier
+    return values
+
+# Write a table compressed, most of a table is draws and impossible positions so it shrinks a lot
+def writeTable(name, values, directory=TABLEBASE_DIR):
+
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, name + ".tb"), "wb") as table_file:
+        table_file.write(TABLEBASE_MAGIC)
+        table_file.write(zlib.compress(bytes(values), 9))
+
+# Read a table, None if it has not been generated
+def readTable(name, directory=TABLEBASE_DIR):
+
+    path = os.path.join(directory, name + ".tb")
+    if (not os.path.exists(path)):
+        return None
+    with open(path, "rb") as table_file:
+        data = table_file.read()
+    if (not data.startswith(TABLEBASE_MAGIC)):
+        raise ValueError("Not a tablebase file: " + path)
+    return zlib.decompress(data[len(TABLEBASE_MAGIC):])
+
+# Get a table, loaded on first use
+def getTable(name):
+
+    if (name not in tables):
+        tables[name] = readTable(name, TABLEBASE_DIR)
+    return tables[name]
+
+# Exact result of the position for the side to move: (1, plies to mate) for a win, (-1, plies to mate) for a loss,
+# (0, 0) for a draw, or None when no table covers the material
+def probe(game_state):
+
+    # Quick count first, this runs at every search node
+    board = game_state.board
+    if (sum(row.count("--") for row in board) < 64 - MAX_PIECES):
+        return None
+    pieces = {"w": [], "b": []}
+    kings = {}
+    for row in range(8):
+        for col in range(8):
+            piece = board[row][col]
+            if (piece[1] == "K"):
+                kings[piece[0]] = row * 8 + col
+            elif (piece != "--"):
+                pieces[piece[0]].append((piece[1].upper(), row * 8 + col))
+    if (pieces["w"] and pieces["b"]):
+        return None
+    strong = "w" if pieces["w"] else "b"
+    strong_pieces = sorted(pieces[strong], key=lambda piece: PIECE_ORDER.index(piece[0]))
+    if (len(strong_pieces) == 0 or (len(strong_pieces) == 1 and strong_pieces[0][0] in "BN")):
+        return (0, 0)  # Nobody can mate
+    table = getTable(tableName("".join(piece for piece, square in strong_pieces)))
+    if (table is None):
+        return None
+
+    # Tables have the strong side playing up the board, so black's pieces are mirrored top to bottom
+    squares = [kings[strong], kings["b" if strong == "w" else "w"]] + [square for piece, square in strong_pieces]
+    if (strong == "b"):
+        squares = [(7 - square // 8) * 8 + square % 8 for square in squares]
+    strong_to_move = game_state.white_to_move == (strong == "w")
+    value = table[positionIndex(squares, strong_to_move)]
+    if (value == 0 or value == ILLEGAL):
+        return (0, 0)
+    return (1 if strong_to_move else -1, value - 1)
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description="Build endgame tablebases by retrograde analysis")
+    parser.add_argument("tables", nargs="*", default=list(TABLEBASES),
+                        help="tables to build (default: " + " ".join(TABLEBASES) + ")")
+    parser.add_argument("--output-dir", default=TABLEBASE_DIR, help="directory for the table files")
+    args = parser.parse_args(argv)
+
+    generated = {}
+    for name in args.tables:
+        pieces = name[1:-1]
+        if (tableName(pieces) != name or not 1 <= len(pieces) <= MAX_PIECES - 2 or name[-1] != "K"):
+            print("Unsupported table " + name + ", expected a name like " + " or ".join(TABLEBASES))
+            return 1
+
+        # Promotions need the table with a queen instead of the pawn
+        dependencies = {}
+        for i, piece in enumerate(pieces):
+            if (piece == "P"):
+                promoted_name = tableName(pieces[:i] + "Q" + pieces[i + 1:])
+                dependencies[promoted_name] = generated.get(promoted_name) or readTable(promoted_name, args.output_dir)
+                if (dependencies[promoted_name] is None):
+                    print("Build " + promoted_name + " before " + name)
+                    return 1
+
+        start_time = time.perf_counter()
+        values = generateTable(name, dependencies)
+        generated[name] = values
+        writeTable(name, values, args.output_dir)
+        wins = sum(1 for value in values if 0 < value < ILLEGAL)
+        longest = max((value for value in values if value < ILLEGAL), default=1) - 1
+        print(f"{name}: {wins} winning positions, longest mate {longest} plies, "
+              f"{time.perf_counter() - start_time:.1f}s")
+    return 0
+
+if (__name__ == "__main__"):
+    sys.exit(main())
@@ -0,0 +1,172 @@
+"""
+Moksh S. GHP Project 2024
+ChessUCI.py
+Headless text front end for the engine, speaking a subset of the UCI protocol on stdin/stdout
+Supports uci, isready, ucinewgame, position, go (depth, movetime, wtime/btime, infinite), stop, quit and d (print FEN)
+"""
+
+# Importing the required libraries
+import sys
+import threading
+import time
+import ChessAI, ChessBitboard, ChessTablebase, ChessWorker
+
+ENGINE_NAME = "Move Master"
+ENGINE_AUTHOR = "Moksh S."
+MOVES_TO_GO = 30  # Assumed number of moves left when only the clock times are given
+
+
+# Write one line of output straight away, a GUI or script is waiting on it
+def send(line):
+    print(line, flush=True)
+
+# Set up a position from "position startpos|fen <fen> [moves ...]"
+def parsePosition(tokens):
+
+    if ("moves" in tokens):
+        moves = tokens[tokens.index("moves") + 1:]
+        tokens = tokens[:tokens.index("moves")]
+    else:
+        moves = []
+    if (tokens and tokens[0] == "fen"):
+        game_state = ChessBitboard.BitboardGameState(" ".join(tokens[1:]))
+    else:
+        game_state = ChessBitboard.BitboardGameState()
+    for notation in moves:
+        game_state.makeMove(ChessWorker.findMoveByNotation(game_state, notation))
+    return game_state
+
+# Separate game state with the same start position and history, so the search never touches the one "d" prints
+def copyGameState(game_state):
+
+    search_state = ChessBitboard.BitboardGameState(game_state.start_fen)
+    for move in game_state.move_log:
+        search_state.makeMove(move)
+    return search_state
+
+# Work out the depth and time limit of a "go" command
+def parseGo(tokens, white_to_move):
+
+    options = {}
+    for i, token in enumerate(tokens):
+        if (token in ("depth", "movetime", "wtime", "btime", "winc", "binc", "movestogo")):
+            if (i + 1 >= len(tokens) or not tokens[i + 1].lstrip("-").isdigit()):
+                raise ValueError("go " + token + " needs a whole number")
+            options[token] = int(tokens[i + 1])
+    max_depth = min(max(options.get("depth", ChessAI.MAX_DEPTH), 1), ChessAI.MAX_DEPTH)  # The search tables stop at MAX_DEPTH
+    if ("infinite" in tokens):
+        time_limit_ms = float("inf")
+    elif ("movetime" in options):
+        time_limit_ms = options["movetime"]
+    elif (("wtime" if white_to_move else "btime") in options):
+        remaining = options["wtime" if white_to_move else "btime"]
+        increment = options.get("winc" if white_to_move else "binc", 0)
+        time_limit_ms = max(10, remaining // options.get("movestogo", MOVES_TO_GO) + increment // 2)
+    elif ("depth" in options):
+        time_limit_ms = float("inf")
+    else:
+        time_limit_ms = ChessAI.TIME_LIMIT_MS
+    return max_depth, time_limit_ms
+
+# Score in UCI terms from the side to move's point of view
+def formatScore(score, principal_variation):
+
+    if (score >= ChessAI.CHECKMATE):
+        return "mate " + str((len(principal_variation) + 1) // 2)
+    if (score <= -ChessAI.CHECKMATE):
+        return "mate -" + str(len(principal_variation) // 2)
+
+    # Tablebase wins and losses carry their distance to mate in plies, counted from after the root move
+    if (abs(score) > ChessAI.TABLEBASE_WIN - ChessTablebase.ILLEGAL):
+        distance = ChessAI.TABLEBASE_WIN - abs(score) + 1
+        return "mate " + str((distance + 1) // 2) if score > 0 else "mate -" + str(distance // 2)
+    return "cp " + str(int(round(score * 100)))
+
+# Search in a background thread so "stop" can be read while it runs
+class SearchThread(threading.Thread):
+
+    def __init__(self, game_state, max_depth, time_limit_ms, infinite=False):
+
+        super().__init__(daemon=True)
+        self.game_state = game_state
+        self.max_depth = max_depth
+        self.time_limit_ms = time_limit_ms
+        self.infinite = infinite  # Hold bestmove until "stop", even when the deepest search finishes early
+        self.stop_event = threading.Event()
+
+    # Print an info line as every depth completes
+    def reportIteration(self, depth, best_move, score):
+
+        elapsed = time.perf_counter() - self.start_time
+        nodes = ChessAI.nodes + ChessAI.qsearch_nodes
+        principal_variation = ChessAI.principal_variation or [best_move]
+        send("info depth " + str(depth) + " score " + formatScore(score, principal_variation) +
+             " nodes " + str(nodes) + " nps " + str(int(nodes / elapsed) if elapsed > 0 else 0) +
+             " time " + str(int(elapsed * 1000)) + " pv " + " ".join(move.getUCINotation() for move in principal_variation))
+
+    def run(self):
+
+        self.start_time = time.perf_counter()
+        valid_moves = self.game_state.getValidMoves()
+        if (len(valid_moves) == 0):
+            if (self.infinite):
+                self.stop_event.wait()
+            send("bestmove 0000")
+            return
+        iterations = ChessAI.iterativeDeepening(self.game_state, valid_moves, self.time_limit_ms, self.max_depth,
+                                                self.stop_event, self.reportIteration)
+        best_move = iterations[-1][1] if iterations else valid_moves[0]
+        if (self.infinite):
+            self.stop_event.wait()
+        send("bestmove " + best_move.getUCINotation())
+
+def main(input_stream=sys.stdin):
+
+    game_state = ChessBitboard.BitboardGameState()
+    search = None
+    for line in input_stream:
+        tokens = line.split()
+        if (not tokens):
+            continue
+        command = tokens[0]
+
+        if (command == "uci"):
+            send("id name " + ENGINE_NAME)
+            send("id author " + ENGINE_AUTHOR)
+            send("uciok")
+        elif (command == "isready"):
+            send("readyok")
+        elif (command in ("stop", "quit", "ucinewgame", "position", "go") and search is not None):
+
+            # Only one search at a time, anything but isready finishes the running one first
+            search.stop_event.set()
+            search.join()
+            search = None
+
+        if (command == "quit"):
+            break
+        elif (command == "ucinewgame"):
+            ChessAI.transposition_table.clear()
+            game_state = ChessBitboard.BitboardGameState()
+        elif (command == "position"):
+            try:
+                game_state = parsePosition(tokens[1:])
+            except ValueError as error:
+                send("info string " + str(error))
+        elif (command == "go"):
+            try:
+                max_depth, time_limit_ms = parseGo(tokens[1:], game_state.white_to_move)
+            except ValueError as error:
+                send("info string " + str(error))
+                continue
+            search = SearchThread(copyGameState(game_state), max_depth, time_limit_ms, "infinite" in tokens)
+            search.start()
+        elif (command == "d"):
+            send(game_state.getFEN())
+
+    if (search is not None):
+        search.stop_event.set()
+        search.join()
+
+if (__name__ == "__main__"):
+    main()
@@ -0,0 +1,194 @@
+"""
+Moksh S. GHP Project 2024
+ChessWorker.py
+Long-lived engine process for the GUI
+Receives positions as a start FEN plus a list of moves, replays only the moves it has not seen yet,
+and keeps its transposition table between moves
+"""
+
+# Importing the required libraries
+import atexit
+import multiprocessing
+import queue
+import threading
+import ChessEngine, ChessAI, ChessBitboard
+
+WATCH_INTERVAL = 0.5  # Seconds between checks that the engine process is still running
+
+
+# Cancellation token for one request, set once the GUI cancels this request or any later one
+class CancelToken:
+
+    def __init__(self, cancelled_request_id, request_id):
+        self.cancelled_request_id = cancelled_request_id
+        self.request_id = request_id
+
+    def is_set(self):
+        return self.cancelled_request_id.value >= self.request_id
+
+# Handle to the engine process, used from the GUI process
+# With on_response set, a thread waits for the engine's replies and calls it for each one,
+# so the GUI can sleep until a reply arrives instead of polling for it
+class EngineWorker:
+
+    def __init__(self, use_bitboards=True, time_limit_ms=ChessAI.TIME_LIMIT_MS, workers=1, on_response=None):
+
+        self.time_limit_ms = time_limit_ms
+        self.workers = workers
+        self.request_queue = multiprocessing.Queue()
+        self.response_queue = multiprocessing.Queue()
+        self.cancelled_request_id = multiprocessing.RawValue("q", 0)  # Requests up to this id are cancelled
+        self.last_request_id = 0
+        self.responses = {}
+        self.responses_lock = threading.Lock()
+        self.stopping = False
+
+        # Not a daemon, so a parallel search can start its pool of processes inside it
+        # stop() ends it, and runs at exit too so a forgotten engine does not keep the program waiting
+        self.process = multiprocessing.Process(target=engineLoop,
+                                               args=(self.request_queue, self.response_queue,
+                                                     self.cancelled_request_id, use_bitboards))
+        self.process.start()
+        atexit.register(self.stop)
+        self.watcher = None
+        if (on_response is not None):
+            self.watcher = threading.Thread(target=self.watchResponses, args=(on_response,), daemon=True)
+            self.watcher.start()
+
+    # Ask for the best move in the game state's position, returns the request id to poll with
+    # ponder_move searches the position after that move instead, the opponent's expected reply
+    def requestMove(self, game_state, time_limit_ms=None, max_depth=ChessAI.MAX_DEPTH, ponder_move=None):
+
+        self.last_request_id += 1
+        moves = [move.getUCINotation() for move in game_state.move_log]
+        if (ponder_move is not None):
+            moves.append(ponder_move)
+        self.request_queue.put((self.last_request_id, game_state.start_fen, moves,
+                                time_limit_ms if time_limit_ms is not None else self.time_limit_ms,
+                                max_depth, self.workers))
+        return self.last_request_id
+
+    # Cancel every request sent so far, the engine stops searching instead of being terminated
+    def cancel(self):
+        self.cancelled_request_id.value = self.last_request_id
+        with self.responses_lock:
+            self.responses.clear()
+
+    # Keep a response until it is polled, returns False for a cancelled one
+    def storeResponse(self, response):
+
+        if (response["request_id"] <= self.cancelled_request_id.value):
+            return False
+        with self.responses_lock:
+            self.responses[response["request_id"]] = response
+        return True
+
+    # Watcher thread: wait for each response, store it and tell the GUI, until stop sends None
+    # If the engine process dies the GUI is told too, so its poll reports the error instead of waiting forever
+    def watchResponses(self, on_response):
+
+        while (True):
+            try:
+                response = self.response_queue.get(timeout=WATCH_INTERVAL)
+            except queue.Empty:
+                if (not self.process.is_alive()):
+                    if (not self.stopping):
+                        on_response()
+                    break
+                continue
+            if (response is None):
+                break
+            if (self.storeResponse(response)):
+                on_response()
+
+    # Response of a request as a dict, or None while the engine is still searching
+    # Raises RuntimeError if the engine process has died, no response would ever come
+    def pollResponse(self, request_id):
+
+        engine_alive = self.process.is_alive()  # Checked first, so replies sent before it exited are still read
+        while (self.watcher is None or not engine_alive):
+            try:
+                response = self.response_queue.get_nowait()
+            except queue.Empty:
+                break
+            if (response is not None):
+                self.storeResponse(response)
+        with self.responses_lock:
+            response = self.responses.pop(request_id, None)
+        if (response is None and not engine_alive):
+            raise RuntimeError("Engine process exited with code " + str(self.process.exitcode))
+        return response
+
+    # Shut the engine process down
+    def stop(self):
+
+        if (self.stopping):
+            return
+        self.stopping = True
+        atexit.unregister(self.stop)
+        self.cancel()
+        if (self.process.is_alive()):
+            self.request_queue.put(None)
+            self.process.join(timeout=1)
+        if (self.process.is_alive()):
+            self.process.terminate()
+        if (self.watcher is not None and self.watcher.is_alive()):
+            self.response_queue.put(None)
+            self.watcher.join(timeout=1)
+
+        # Nobody reads the queues any more, exiting must not wait to flush them
+        self.request_queue.cancel_join_thread()
+        self.response_queue.cancel_join_thread()
+
+# Find the legal move with the given long algebraic notation
+# The engine always promotes to a queen, so any promotion piece is accepted for a promotion move
+def findMoveByNotation(game_state, notation):
+
+    move = game_state.getValidMoves(indexed=True).findUCIMove(notation)
+    if (move is not None):
+        return move
+    raise ValueError("Illegal move " + notation + " in position " + game_state.getFEN())
+
+# Engine process: bring the game state up to date with each request and search it
+def engineLoop(request_queue, response_queue, cancelled_request_id, use_bitboards):
+
+    game_state_class = ChessBitboard.BitboardGameState if use_bitboards else ChessEngine.GameState
+    game_state = None
+    applied_moves = []
+    while (True):
+        request = request_queue.get()
+        if (request is None):
+            break
+        request_id, start_fen, moves, time_limit_ms, max_depth, workers = request
+        token = CancelToken(cancelled_request_id, request_id)
+        if (token.is_set()):
+            continue
+
+        # Undo back to the last move both games share, then replay only the new moves
+        if (game_state is None or game_state.start_fen != start_fen):
+            game_state = game_state_class(start_fen)
+            applied_moves = []
+        common = 0
+        while (common < min(len(applied_moves), len(moves)) and applied_moves[common] == moves[common]):
+            common += 1
+        while (len(applied_moves) > common):
+            game_state.undoMove()
+            applied_moves.pop()
+        for notation in moves[common:]:
+            game_state.makeMove(findMoveByNotation(game_state, notation))
+            applied_moves.append(notation)
+
+        result_queue = queue.SimpleQueue()
+        valid_moves = game_state.getValidMoves()
+        if (workers > 1):
+            ChessAI.findBestMoveParallel(game_state, valid_moves, result_queue, workers, time_limit_ms, max_depth, token)
+        else:
+            ChessAI.findBestMove(game_state, valid_moves, result_queue, time_limit_ms, max_depth, token)
+        best_move = result_queue.get()
+        response_queue.put({"request_id": request_id,
+                            "move": best_move.getUCINotation() if best_move is not None else None,
+                            "cancelled": token.is_set(),
+                            "depth": ChessAI.search_depth,
+                            "nodes": ChessAI.nodes,
+                            "qsearch_nodes": ChessAI.qsearch_nodes,
+                            "stats": ChessAI.search_stats.asDict()})